@@ -0,0 +1,283 @@
+# armazem.py
+"""Armazenamento compacto do estado dos lugares do parque."""
+
+import multiprocessing
+import threading
+from array import array
+from contextlib import ExitStack, contextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+# Códigos de estado guardados no vetor de estados (0 = ID ainda não registado)
+NAO_REGISTADO = 0
+LIVRE = 1
+OCUPADO = 2
+
+ESTADOS = (None, "LIVRE", "OCUPADO")  # código -> texto (strings partilhadas)
+CODIGOS = {"LIVRE": LIVRE, "OCUPADO": OCUPADO}
+
+# Cabeçalho de contadores (int64) no início do buffer, antes do vetor de estados.
+# Seguem-se, por fatia, n_fatias contadores de ocupados e n_fatias de versões e,
+# por processo TCP, o último atraso medido do seu event loop (µs).
+_REGISTADOS = 0
+_LIGACOES = 1
+_N_CONTADORES_FIXOS = 2
+
+
+class ArmazemLugares:
+    """
+    Estados dos lugares num vetor de bytes indexado pelo ID (1 byte por lugar),
+    com a mesma interface de um dicionário id -> "LIVRE"/"OCUPADO".
+
+    Os IDs são atribuídos sequencialmente a partir de 1 e nunca ultrapassam a
+    capacidade, por isso o vetor tem tamanho fixo (capacidade + 1).
+
+    As escritas são protegidas por locks em fatias (lugar_id % n_fatias), cada
+    uma com o seu contador de ocupados; o total lê-se sem adquirir nenhum lock.
+
+    Com partilhado=True, contadores e estados ficam num segmento de memória
+    partilhada (multiprocessing.shared_memory) e os locks são de processo:
+    processos criados por fork escrevem no mesmo estado que o processo Flask lê.
+    """
+
+    __slots__ = (
+        "capacidade",
+        "n_fatias",
+        "_shm",
+        "_contadores",
+        "_estados",
+        "_locks",
+        "_lock_ligacoes",
+        "_ocupados",
+        "_versoes",
+        "_atrasos",
+    )
+
+    def __init__(
+        self,
+        capacidade: int,
+        n_fatias: int = 1,
+        partilhado: bool = False,
+        versao_inicial: int = 0,
+        n_processos: int = 1,
+    ):
+        self.capacidade = capacidade
+        self.n_fatias = n_fatias
+
+        tamanho_cabecalho = 8 * (_N_CONTADORES_FIXOS + 2 * n_fatias + n_processos)
+        tamanho = tamanho_cabecalho + capacidade + 1
+
+        if partilhado:
+            from multiprocessing import shared_memory
+
+            contexto = multiprocessing.get_context("fork")
+            self._shm = shared_memory.SharedMemory(create=True, size=tamanho)
+            buffer = self._shm.buf
+            self._locks = [contexto.Lock() for _ in range(n_fatias)]
+            self._lock_ligacoes = contexto.Lock()
+        else:
+            self._shm = None
+            buffer = memoryview(bytearray(tamanho))
+            self._locks = [threading.Lock() for _ in range(n_fatias)]
+            self._lock_ligacoes = threading.Lock()
+
+        self._contadores = buffer[:tamanho_cabecalho].cast("q")
+        self._ocupados = self._contadores[_N_CONTADORES_FIXOS:_N_CONTADORES_FIXOS + n_fatias]
+        self._versoes = self._contadores[_N_CONTADORES_FIXOS + n_fatias:_N_CONTADORES_FIXOS + 2 * n_fatias]
+        self._atrasos = self._contadores[_N_CONTADORES_FIXOS + 2 * n_fatias:]
+        self._estados = buffer[tamanho_cabecalho:]
+        self._versoes[0] = versao_inicial
+
+    @property
+    def partilhado(self) -> bool:
+        return self._shm is not None
+
+    def fechar(self) -> None:
+        """Liberta o segmento de memória partilhada (só no processo que o criou)."""
+        if self._shm is not None:
+            for vista in (self._ocupados, self._versoes, self._atrasos, self._contadores, self._estados):
+                vista.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    @property
+    def versao(self) -> int:
+        """
+        Versão global: versao_inicial mais a soma das versões das fatias, cada
+        uma incrementada (com o lock da fatia) a cada alteração efetiva de
+        estado. Nunca diminui e só avança depois do novo estado estar escrito,
+        por isso quem lê versao e depois copia os estados vê sempre pelo menos essa versão.
+        """
+        return sum(self._versoes)
+
+    @property
+    def ligacoes(self) -> int:
+        """Ligações de sensores ativas (somadas entre processos, se partilhado)."""
+        return self._contadores[_LIGACOES]
+
+    def ajustar_ligacoes(self, delta: int) -> None:
+        with self._lock_ligacoes:
+            self._contadores[_LIGACOES] += delta
+
+    @property
+    def atraso_loop_ms(self) -> float:
+        """Maior dos últimos atrasos medidos nos event loops dos processos TCP."""
+        return max(self._atrasos) / 1000
+
+    def definir_atraso_loop(self, processo: int, atraso_ms: float) -> None:
+        # Cada processo só escreve na sua posição: não precisa de lock
+        self._atrasos[processo] = round(atraso_ms * 1000)
+
+    def _codigo(self, lugar_id) -> int:
+        if type(lugar_id) is not int or not 0 < lugar_id <= self.capacidade:
+            return NAO_REGISTADO
+        return self._estados[lugar_id]
+
+    def fatia(self, lugar_id: int) -> int:
+        return lugar_id % self.n_fatias
+
+    def lock_de(self, lugar_id: int):
+        """Lock da fatia a que o lugar pertence."""
+        return self._locks[lugar_id % self.n_fatias]
+
+    def lock_fatia(self, fatia: int):
+        return self._locks[fatia]
+
+    @contextmanager
+    def todos_locks(self):
+        """Adquire os locks de todas as fatias (sempre pela mesma ordem)."""
+        with ExitStack() as pilha:
+            for lock in self._locks:
+                pilha.enter_context(lock)
+            yield
+
+    def __len__(self) -> int:
+        return self._contadores[_REGISTADOS]
+
+    def __contains__(self, lugar_id) -> bool:
+        return self._codigo(lugar_id) != NAO_REGISTADO
+
+    def __getitem__(self, lugar_id) -> str:
+        codigo = self._codigo(lugar_id)
+        if codigo == NAO_REGISTADO:
+            raise KeyError(lugar_id)
+        return ESTADOS[codigo]
+
+    def get(self, lugar_id, default=None):
+        codigo = self._codigo(lugar_id)
+        return default if codigo == NAO_REGISTADO else ESTADOS[codigo]
+
+    def __setitem__(self, lugar_id: int, estado: str) -> None:
+        self.definir(lugar_id, estado)
+
+    def definir(self, lugar_id: int, estado: str) -> str | None:
+        """
+        Altera o estado de um lugar e o contador da sua fatia; devolve o estado
+        anterior (None se ainda não estava registado). Chamar com lock_de(lugar_id).
+        """
+        if type(lugar_id) is not int or not 0 < lugar_id <= self.capacidade:
+            raise KeyError(lugar_id)
+        if estado not in CODIGOS:
+            raise ValueError("Estado inválido")
+
+        anterior = self._estados[lugar_id]
+        novo = CODIGOS[estado]
+        if anterior == novo:
+            return ESTADOS[anterior]
+
+        if anterior == NAO_REGISTADO:
+            # Só acontece no registo, que também é serializado pelo Parque
+            self._contadores[_REGISTADOS] += 1
+        self._estados[lugar_id] = novo
+
+        fatia = lugar_id % self.n_fatias
+        if novo == OCUPADO:
+            self._ocupados[fatia] += 1
+        elif anterior == OCUPADO:
+            self._ocupados[fatia] -= 1
+        self._versoes[fatia] += 1
+        return ESTADOS[anterior]
+
+    def carregar(self, estados: bytes) -> None:
+        """
+        Substitui todo o vetor de estados (ex: recuperação a partir do diário)
+        e recalcula os contadores. Chamar com todos_locks().
+        """
+        if len(estados) != self.capacidade + 1:
+            raise ValueError("Vetor de estados com tamanho diferente da capacidade")
+        self._estados[:] = estados
+        self._contadores[_REGISTADOS] = len(estados) - estados.count(NAO_REGISTADO)
+        for fatia in range(self.n_fatias):
+            self._ocupados[fatia] = estados[fatia::self.n_fatias].count(OCUPADO)
+            self._versoes[fatia] += 1
+
+    def ocupados(self) -> int:
+        """Total de ocupados, somando os contadores das fatias (sem locks)."""
+        return sum(self._ocupados)
+
+    def copia_estados(self) -> bytes:
+        """Cópia imutável do vetor de estados (feita de uma vez, sem locks)."""
+        return bytes(self._estados)
+
+    def items(self):
+        """
+        Pares (id, estado) dos lugares registados, por ordem de ID.
+        Percorre uma cópia do vetor, por isso não bloqueia as escritas.
+        """
+        return _items(self.copia_estados())
+
+    def values(self):
+        return (estado for _, estado in self.items())
+
+    def contar(self, estado: str) -> int:
+        """Conta os lugares num dado estado (varrimento em C sobre uma cópia)."""
+        return self.copia_estados().count(CODIGOS[estado])
+
+
+def _items(estados: bytes):
+    return (
+        (lid, ESTADOS[codigo])
+        for lid, codigo in enumerate(estados)
+        if codigo != NAO_REGISTADO
+    )
+
+
+class Snapshot(NamedTuple):
+    """
+    Vista imutável e versionada do parque, publicada periodicamente pelo Parque.
+    Os handlers REST leem-na sem locks e obtêm sempre valores coerentes entre si
+    (contagens calculadas a partir do mesmo vetor de estados).
+    """
+
+    versao: int
+    instante: float
+    nome: str
+    localizacao: tuple[float, float]
+    tarifa_base: float
+    tarifa_hora: float
+    tarifa_max: float
+    capacidade: int
+    ocupados: int
+    livres: int
+    estados: bytes  # código de estado por ID (índice 0 não é usado)
+
+    @property
+    def percentagem(self) -> float:
+        return round((self.ocupados / self.capacidade) * 100, 2)
+
+    def items(self):
+        """Pares (id, estado) dos lugares registados, por ordem de ID."""
+        return _items(self.estados)
+
+    def alteracoes(self, anterior: "Snapshot") -> list[tuple[int, str]]:
+        """Pares (id, estado) que mudaram desde `anterior` (comparação vetorial dos vetores)."""
+        atual = np.frombuffer(self.estados, dtype=np.uint8)
+        ids = np.flatnonzero(atual != np.frombuffer(anterior.estados, dtype=np.uint8))
+        return [(int(lid), ESTADOS[codigo]) for lid, codigo in zip(ids, atual[ids])]
+
+
+def novo_registo_cliente() -> array:
+    """Lista compacta (4 bytes por ID) dos lugares de um cliente."""
+    return array("I")
@@ -0,0 +1,242 @@
+# assinatura.py
+"""Algoritmos de assinatura das chaves do Parque e cache de assinaturas por mensagem."""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as TempoEsgotado
+from typing import NamedTuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+
+# Nome anunciado no campo "algoritmo" dos envelopes seguros
+RSA_PSS = "RSA-PSS"        # RSA 2048, PSS (salt máximo) + SHA256: o do enunciado
+ECDSA_P256 = "ECDSA-P256"  # ECDSA sobre P-256 + SHA256 (assinatura DER)
+ED25519 = "Ed25519"
+ALGORITMOS = (RSA_PSS, ECDSA_P256, ED25519)
+
+_TIPOS_CHAVE = {
+    RSA_PSS: rsa.RSAPublicKey,
+    ECDSA_P256: ec.EllipticCurvePublicKey,
+    ED25519: ed25519.Ed25519PublicKey,
+}
+
+
+def _pss() -> padding.PSS:
+    return padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+
+
+def gerar_chave(algoritmo: str):
+    """Nova chave privada para `algoritmo` (um de ALGORITMOS)."""
+    if algoritmo == RSA_PSS:
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algoritmo == ECDSA_P256:
+        return ec.generate_private_key(ec.SECP256R1())
+    if algoritmo == ED25519:
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Algoritmo de assinatura desconhecido: {algoritmo!r}")
+
+
+def assinar(chave_privada, algoritmo: str, dados: bytes) -> bytes:
+    if algoritmo == RSA_PSS:
+        return chave_privada.sign(dados, _pss(), hashes.SHA256())
+    if algoritmo == ECDSA_P256:
+        return chave_privada.sign(dados, ec.ECDSA(hashes.SHA256()))
+    if algoritmo == ED25519:
+        return chave_privada.sign(dados)
+    raise ValueError(f"Algoritmo de assinatura desconhecido: {algoritmo!r}")
+
+
+def chave_corresponde(chave_publica, algoritmo: str) -> bool:
+    """A chave pública é do tipo usado por `algoritmo` (e, para ECDSA, da curva P-256)?"""
+    tipo = _TIPOS_CHAVE.get(algoritmo)
+    if tipo is None:
+        raise ValueError(f"Algoritmo de assinatura desconhecido: {algoritmo!r}")
+    if not isinstance(chave_publica, tipo):
+        return False
+    return algoritmo != ECDSA_P256 or chave_publica.curve.name == "secp256r1"
+
+
+def verificar(chave_publica, algoritmo: str, assinatura: bytes, dados: bytes) -> None:
+    """
+    Lança InvalidSignature se a assinatura não for válida, ou ValueError se o
+    algoritmo for desconhecido ou não corresponder ao tipo da chave (um
+    envelope não pode escolher verificar uma chave RSA como se fosse outra).
+    """
+    if not chave_corresponde(chave_publica, algoritmo):
+        raise ValueError(f"A chave do certificado não é {algoritmo}")
+    if algoritmo == RSA_PSS:
+        chave_publica.verify(assinatura, dados, _pss(), hashes.SHA256())
+    elif algoritmo == ECDSA_P256:
+        chave_publica.verify(assinatura, dados, ec.ECDSA(hashes.SHA256()))
+    else:
+        chave_publica.verify(assinatura, dados)
+
+
+class Credenciais(NamedTuple):
+    """
+    Chave privada do Parque e o certificado dela, substituídos sempre juntos
+    (uma só atribuição). Cada pedido seguro lê-as uma vez e usa a chave e o
+    certificado do mesmo tuplo; `geracao` muda a cada nova chave e entra nas
+    chaves das caches, para que assinaturas de chaves diferentes não se misturem.
+    """
+
+    geracao: int
+    chave: object
+    certificado: str | None
+
+
+class CacheAssinaturas:
+    """
+    LRU limitado: (geração da chave, bytes da mensagem) -> assinatura. Uma assinatura RSA-PSS custa
+    cerca de 1 ms de CPU, mas as mensagens assinadas repetem-se muito (o nº de
+    lugares livres, os custos mais pedidos), por isso quase todos os pedidos
+    seguros podem reutilizar uma assinatura já feita.
+
+    As assinaturas PSS são aleatórias mas todas válidas: reutilizar uma é
+    indistinguível de assinar de novo. Como a geração da chave faz parte da
+    chave da cache, uma assinatura da chave anterior nunca serve um pedido da
+    nova; limpar() só liberta a memória dessas entradas.
+    """
+
+    def __init__(self, maximo: int = 256):
+        self.maximo = maximo
+        self._entradas: OrderedDict[tuple[int, bytes], object] = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave: tuple[int, bytes], assinar):
+        """Assinatura guardada para `chave`, ou a de assinar() (sem argumentos), que fica guardada."""
+        with self._lock:
+            assinatura = self._entradas.get(chave)
+            if assinatura is not None:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return assinatura
+            self.falhas += 1
+
+        # Assina fora do lock: pedidos com outras mensagens não esperam por este
+        assinatura = assinar()
+        with self._lock:
+            self._entradas[chave] = assinatura
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+        return assinatura
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "entradas": len(self._entradas),
+        }
+
+
+class ServicoSobrecarregado(Exception):
+    """A fila do serviço de assinatura está cheia (ou a espera excedeu o limite)."""
+
+
+class ServicoAssinatura:
+    """
+    Executa as assinaturas num conjunto fixo de `trabalhadores` threads, em vez
+    de na thread de cada pedido HTTP: uma rajada de pedidos seguros fica em
+    fila (FIFO) e não ocupa todos os cores, e os endpoints sem assinatura
+    mantêm a latência. As operações de chave privada da cryptography libertam
+    o GIL, por isso threads chegam (sem copiar a chave para outros processos).
+
+    Pedidos com a mesma chave (geração da chave do Parque e bytes da mensagem)
+    que chegam enquanto um já está na fila ou a ser assinado esperam pelo
+    mesmo resultado. Acima de `fila_max` pedidos
+    pendentes, ou ao fim de `espera_max` segundos, lança ServicoSobrecarregado.
+
+    Trabalho de fundo (ex: a tabela de custos pré-assinados) também corre
+    nestes trabalhadores, com prioridade baixa: ver executar_em_segundo_plano.
+    """
+
+    def __init__(self, trabalhadores: int, fila_max: int, espera_max: float):
+        self._executor = ThreadPoolExecutor(
+            max_workers=trabalhadores, thread_name_prefix="assinatura"
+        )
+        self.trabalhadores = trabalhadores
+        self.fila_max = fila_max
+        self.espera_max = espera_max
+        self._lock = threading.Lock()
+        self._em_curso: dict[tuple[int, bytes], Future] = {}
+        self.pendentes = 0   # na fila ou a ser assinados
+        self.a_executar = 0
+        self.assinadas = 0
+        self.coalescidos = 0
+        self.rejeitados = 0
+        self.tarefas_fundo = 0
+
+    def assinar(self, chave: tuple[int, bytes], assinar) -> str:
+        """Resultado de assinar() (sem argumentos), executada num dos trabalhadores."""
+        with self._lock:
+            futuro = self._em_curso.get(chave)
+            if futuro is not None:
+                self.coalescidos += 1
+            else:
+                if self.pendentes >= self.fila_max:
+                    self.rejeitados += 1
+                    raise ServicoSobrecarregado(f"{self.pendentes} assinaturas pendentes")
+                futuro = self._executor.submit(self._executar, assinar)
+                self._em_curso[chave] = futuro
+                self.pendentes += 1
+                futuro.add_done_callback(lambda _, c=chave: self._terminado(c))
+
+        try:
+            return futuro.result(self.espera_max)
+        except TempoEsgotado:
+            raise ServicoSobrecarregado(f"assinatura não concluída em {self.espera_max} s")
+
+    def executar_em_segundo_plano(self, tarefa, pausa: float = 0.01):
+        """
+        Executa tarefa() num trabalhador, mas só quando nenhum pedido está à
+        espera na fila e há um trabalhador livre: até lá, espera `pausa` s e
+        volta a ver. Manter cada tarefa curta (ex: poucas assinaturas), porque
+        um pedido que chegue depois espera que ela termine.
+        """
+        while True:
+            with self._lock:
+                if self.pendentes < self.trabalhadores:
+                    futuro = self._executor.submit(self._executar, tarefa)
+                    self.pendentes += 1
+                    self.tarefas_fundo += 1
+                    futuro.add_done_callback(lambda _: self._terminado(None))
+                    break
+            time.sleep(pausa)
+        return futuro.result()
+
+    def _executar(self, assinar) -> str:
+        with self._lock:
+            self.a_executar += 1
+        try:
+            return assinar()
+        finally:
+            with self._lock:
+                self.a_executar -= 1
+                self.assinadas += 1
+
+    def _terminado(self, chave: tuple[int, bytes] | None) -> None:
+        with self._lock:
+            if chave is not None:
+                del self._em_curso[chave]
+            self.pendentes -= 1
+
+    def estatisticas(self) -> dict:
+        return {
+            "trabalhadores": self.trabalhadores,
+            "fila": self.pendentes - self.a_executar,
+            "a_executar": self.a_executar,
+            "assinadas": self.assinadas,
+            "coalescidos": self.coalescidos,
+            "rejeitados": self.rejeitados,
+            "tarefas_fundo": self.tarefas_fundo,
+        }
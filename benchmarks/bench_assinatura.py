@@ -0,0 +1,56 @@
+"""Assinaturas (e verificações) por segundo, num só core, para cada algoritmo de chave do Parque."""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+
+try:  # Permite executar o script diretamente ou como módulo do pacote FSD
+    from FSD.assinatura import ALGORITMOS, assinar, gerar_chave, verificar
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from assinatura import ALGORITMOS, assinar, gerar_chave, verificar
+
+
+DURACAO = 1.0  # segundos de medição por operação
+
+# Uma mensagem típica de /secure/info
+MENSAGEM = json.dumps(
+    {
+        "nome": "Parque-Centro",
+        "lotacao": 25,
+        "livre": 12,
+        "tarifa_base": 1.0,
+        "tarifa/h": 0.8,
+        "tarifa_max": 6.0,
+        "latitude": 41.55,
+        "longitude": -8.42,
+    }
+).encode("utf-8")
+
+
+def _por_segundo(funcao) -> float:
+    n = 0
+    inicio = time.perf_counter()
+    while (decorrido := time.perf_counter() - inicio) < DURACAO:
+        funcao()
+        n += 1
+    return n / decorrido
+
+
+def main() -> None:
+    print(f"Mensagem de {len(MENSAGEM)} bytes, {DURACAO:.0f} s por medição, 1 thread")
+    print(f"  {'algoritmo':<11} {'assinaturas/s':>14} {'verificações/s':>15} {'bytes':>6}")
+    for algoritmo in ALGORITMOS:
+        chave = gerar_chave(algoritmo)
+        publica = chave.public_key()
+        assinatura = assinar(chave, algoritmo, MENSAGEM)
+        assinaturas = _por_segundo(lambda: assinar(chave, algoritmo, MENSAGEM))
+        verificacoes = _por_segundo(lambda: verificar(publica, algoritmo, assinatura, MENSAGEM))
+        print(f"  {algoritmo:<11} {assinaturas:14,.0f} {verificacoes:15,.0f} {len(assinatura):6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Contenção nas escritas dos sensores com leitores REST em simultâneo:
+um único lock (modelo original) vs. locks em fatias (ArmazemLugares).
+
+Os leitores fazem um número fixo de leituras por segundo nos dois modelos
+(como clientes REST a consultar /lugares), para comparar as escritas com a
+mesma carga de leitura em vez de deixar cada modelo ler o que conseguir.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import sys
+import threading
+import time
+
+try:  # Permite executar o script diretamente ou como módulo do pacote FSD
+    from FSD.armazem import ArmazemLugares
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from armazem import ArmazemLugares
+
+
+CAPACIDADE = 100_000
+SENSORES = 32      # threads escritoras (como handle_client)
+LEITORES = 4       # threads a fazer o equivalente a /lugares
+LEITURAS_POR_SEGUNDO = 8  # total de /lugares por segundo, igual nos dois modelos
+DURACAO = 3.0      # segundos por cenário
+FATIAS = 16
+
+
+class _ModeloLockUnico:
+    """Um só lock para escritas e leituras, como Parque.lock antes das fatias."""
+
+    def __init__(self, capacidade: int):
+        self.lugares = ArmazemLugares(capacidade, n_fatias=1)
+        self.lock = self.lugares.lock_fatia(0)
+        for lid in range(1, capacidade + 1):
+            self.lugares.definir(lid, "LIVRE")
+
+    def escrever(self, lugar_id: int, estado: str) -> None:
+        with self.lock:
+            self.lugares.definir(lugar_id, estado)
+
+    def ler(self) -> list:
+        # /lugares e /dashboard percorriam os lugares com o lock adquirido
+        with self.lock:
+            return [{"id": lid, "estado": e} for lid, e in self.lugares.items()]
+
+
+class _ModeloFatias:
+    """Locks em fatias para as escritas; leituras sobre uma cópia, sem locks."""
+
+    def __init__(self, capacidade: int):
+        self.lugares = ArmazemLugares(capacidade, n_fatias=FATIAS)
+        for lid in range(1, capacidade + 1):
+            self.lugares.definir(lid, "LIVRE")
+
+    def escrever(self, lugar_id: int, estado: str) -> None:
+        with self.lugares.lock_de(lugar_id):
+            self.lugares.definir(lugar_id, estado)
+
+    def ler(self) -> list:
+        return [{"id": lid, "estado": e} for lid, e in self.lugares.items()]
+
+
+def _cenario(modelo) -> tuple[float, float, float, float, float]:
+    """
+    Devolve (escritas/s, leituras/s feitas, p99 e máximo da latência de
+    escrita em ms, p99 da latência de leitura em ms).
+    """
+    escritas = [0] * SENSORES
+    leituras = [0] * LEITORES
+    latencias: list[list[float]] = [[] for _ in range(SENSORES)]
+    latencias_leitura: list[list[float]] = [[] for _ in range(LEITORES)]
+    # Cada thread verifica o prazo por si: com um lock muito disputado, a thread
+    # principal pode nem conseguir o GIL a tempo de as mandar parar
+    inicio = time.perf_counter()
+    fim = inicio + DURACAO
+
+    def sensor(indice: int) -> None:
+        rng = random.Random(indice)
+        amostras = latencias[indice]
+        agora = time.perf_counter()
+        while agora < fim:
+            modelo.escrever(rng.randint(1, CAPACIDADE), rng.choice(("LIVRE", "OCUPADO")))
+            depois = time.perf_counter()
+            amostras.append(depois - agora)
+            escritas[indice] += 1
+            # Entre dois UPDATE o handle_client espera pela rede: cede a vez
+            time.sleep(0)
+            agora = time.perf_counter()
+
+    def leitor(indice: int) -> None:
+        # Calendário fixo (desfasado entre leitores): uma leitura atrasada não
+        # adia as seguintes, para que a carga pedida seja a mesma nos dois modelos
+        intervalo = LEITORES / LEITURAS_POR_SEGUNDO
+        proxima = inicio + indice * intervalo / LEITORES
+        while True:
+            espera = proxima - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            if proxima >= fim:
+                break
+            modelo.ler()
+            latencias_leitura[indice].append(time.perf_counter() - proxima)
+            leituras[indice] += 1
+            proxima += intervalo
+
+    threads = [threading.Thread(target=sensor, args=(i,)) for i in range(SENSORES)]
+    threads += [threading.Thread(target=leitor, args=(i,)) for i in range(LEITORES)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    todas = sorted(x for amostras in latencias for x in amostras)
+    p99 = todas[int(len(todas) * 0.99)] if todas else 0.0
+    maximo = todas[-1] if todas else 0.0
+    lidas = sorted(x for amostras in latencias_leitura for x in amostras)
+    p99_leitura = lidas[int(len(lidas) * 0.99)] if lidas else 0.0
+    return (
+        sum(escritas) / DURACAO, sum(leituras) / DURACAO,
+        p99 * 1000, maximo * 1000, p99_leitura * 1000,
+    )
+
+
+def main() -> None:
+    print(
+        f"{CAPACIDADE} lugares, {SENSORES} sensores, {LEITORES} leitores REST "
+        f"({LEITURAS_POR_SEGUNDO} leituras/s no total), {DURACAO:.0f}s por cenário"
+    )
+    for nome, modelo in (
+        ("lock único", _ModeloLockUnico(CAPACIDADE)),
+        (f"{FATIAS} fatias", _ModeloFatias(CAPACIDADE)),
+    ):
+        escritas, leituras, p99, maximo, p99_leitura = _cenario(modelo)
+        print(
+            f"  {nome:<10}: {escritas:12,.0f} escritas/s  {leituras:5.1f} leituras/s  "
+            f"latência de escrita p99 {p99:7.3f} ms, máx {maximo:7.1f} ms  "
+            f"(leitura p99 {p99_leitura:6.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Recuperação a partir do diário: tempo de reprodução com milhões de eventos."""
+
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+try:  # Permite executar o script diretamente ou como módulo do pacote FSD
+    from FSD.armazem import LIVRE, NAO_REGISTADO, ArmazemLugares
+    from FSD.diario import Diario
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from armazem import LIVRE, NAO_REGISTADO, ArmazemLugares
+    from diario import Diario
+
+
+LUGARES = 100_000
+EVENTOS = (1_000_000, 5_000_000)
+LOTE = 1_000  # eventos por escrita (como um MUPDATE grande)
+
+
+def _gerar(diario: Diario, n_eventos: int) -> None:
+    for lid in range(1, LUGARES + 1):
+        diario.registar_nome(lid, f"maquina-Lugar-{lid}")
+    aleatorio = random.Random(42)
+    estados = ("LIVRE", "OCUPADO")
+    for _ in range(n_eventos // LOTE):
+        diario.registar_estados(
+            (aleatorio.randint(1, LUGARES), estados[aleatorio.getrandbits(1)])
+            for _ in range(LOTE)
+        )
+
+
+def _reproduzir(diario: Diario) -> ArmazemLugares:
+    # O mesmo trabalho que Parque.restaurar, sem o Parque (chaves RSA, Flask, ...)
+    nomes, estados = diario.reproduzir(LUGARES)
+    vetor = bytearray(estados)
+    for lid in nomes.values():
+        if vetor[lid] == NAO_REGISTADO:
+            vetor[lid] = LIVRE
+    lugares = ArmazemLugares(LUGARES)
+    lugares.carregar(vetor)
+    return lugares
+
+
+def _tamanho(diretoria: str) -> int:
+    return sum(os.path.getsize(os.path.join(diretoria, f)) for f in os.listdir(diretoria))
+
+
+def _medir(diretoria: str) -> tuple[float, ArmazemLugares]:
+    inicio = time.perf_counter()
+    lugares = _reproduzir(Diario(diretoria))
+    return time.perf_counter() - inicio, lugares
+
+
+def main():
+    print(f"{LUGARES} lugares registados")
+    for n_eventos in EVENTOS:
+        with tempfile.TemporaryDirectory() as diretoria:
+            diario = Diario(diretoria)
+            _gerar(diario, n_eventos)
+            tamanho = _tamanho(diretoria)
+            duracao, lugares = _medir(diretoria)
+            print(
+                f"  {n_eventos:>10,} eventos ({tamanho / 2**20:5.1f} MiB): "
+                f"reposto em {duracao * 1000:7.1f} ms, {lugares.ocupados():,} ocupados"
+            )
+
+            # Instantâneo do estado reposto + uma cauda curta de eventos
+            segmento, anteriores = diario.rodar()
+            diario.fechar_fds(anteriores)
+            nomes, _ = Diario(diretoria).reproduzir(LUGARES)
+            diario.gravar_instantaneo(segmento, lugares.copia_estados(), nomes)
+            diario.registar_estados((lid, "OCUPADO") for lid in range(1, LOTE + 1))
+            diario.fechar()
+            tamanho = _tamanho(diretoria)
+            duracao, lugares = _medir(diretoria)
+            print(
+                f"  instantâneo + {LOTE:,} eventos ({tamanho / 2**20:5.1f} MiB): "
+                f"reposto em {duracao * 1000:7.1f} ms, {lugares.ocupados():,} ocupados"
+            )
+
+if __name__ == "__main__":
+    main()
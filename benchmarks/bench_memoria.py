@@ -0,0 +1,79 @@
+"""Memória por lugar: dicionários originais vs. ArmazemLugares (bytearray + arrays)."""
+
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import tracemalloc
+
+try:  # Permite executar o script diretamente ou como módulo do pacote FSD
+    from FSD.armazem import ArmazemLugares, novo_registo_cliente
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from armazem import ArmazemLugares, novo_registo_cliente
+
+
+TAMANHOS = (10_000, 100_000, 1_000_000)
+LUGARES_CLIENTE = 10  # lugares por ligação (como no simulador)
+
+
+def _nome(indice: int) -> str:
+    # Construído em runtime, tal como os nomes que chegam pelo socket
+    return "".join(("maquina-", "Lugar-", str(indice)))
+
+
+def _estado(indice: int) -> str:
+    return "OCUPADO" if indice % 3 == 0 else "LIVRE"
+
+
+def _construir_dicts(n: int):
+    lugares, mapa_nomes, clientes = {}, {}, {}
+    for i in range(1, n + 1):
+        lugares[i] = _estado(i)
+        mapa_nomes[_nome(i)] = i
+        clientes.setdefault(("10.0.0.1", i // LUGARES_CLIENTE), []).append(i)
+    return lugares, mapa_nomes, clientes
+
+
+def _construir_compacto(n: int):
+    lugares, mapa_nomes, clientes = ArmazemLugares(n), {}, {}
+    for i in range(1, n + 1):
+        lugares[i] = _estado(i)
+        mapa_nomes[_nome(i)] = i
+        addr = ("10.0.0.1", i // LUGARES_CLIENTE)
+        if addr not in clientes:
+            clientes[addr] = novo_registo_cliente()
+        clientes[addr].append(i)
+    return lugares, mapa_nomes, clientes
+
+
+def _medir(construir, n: int) -> list[float]:
+    """Bytes por lugar de cada estrutura (lugares, mapa_nomes, clientes)."""
+    resultado = []
+    gc.collect()
+    tracemalloc.start()
+    estruturas = construir(n)
+    for indice in range(len(estruturas)):
+        antes = tracemalloc.get_traced_memory()[0]
+        # Libertar a estrutura e medir quanto desce a memória em uso
+        estruturas = estruturas[:indice] + (None,) + estruturas[indice + 1:]
+        gc.collect()
+        resultado.append((antes - tracemalloc.get_traced_memory()[0]) / n)
+    tracemalloc.stop()
+    return resultado
+
+
+def main() -> None:
+    print(f"{'lugares':>10} | {'estrutura':<10} | {'dicts':>9} | {'compacto':>9} | (bytes/lugar)")
+    for n in TAMANHOS:
+        originais = _medir(_construir_dicts, n)
+        compactos = _medir(_construir_compacto, n)
+        nomes = ("lugares", "mapa_nomes", "clientes")
+        for nome, a, b in zip(nomes, originais, compactos):
+            print(f"{n:>10} | {nome:<10} | {a:9.1f} | {b:9.1f}")
+        print(f"{n:>10} | {'total':<10} | {sum(originais):9.1f} | {sum(compactos):9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compara o protocolo de texto com o binário: bytes por UPDATE e custo de descodificação."""
+
+from __future__ import annotations
+
+import os
+import sys
+import timeit
+
+try:  # Permite executar o script diretamente ou como módulo do pacote FSD
+    from FSD.protocolo import (
+        codificar,
+        codificar_mupdate_binario,
+        codificar_update_binario,
+        descodificar,
+        descodificar_binario,
+        enquadrar,
+    )
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from protocolo import (
+        codificar,
+        codificar_mupdate_binario,
+        codificar_update_binario,
+        descodificar,
+        descodificar_binario,
+        enquadrar,
+    )
+
+
+REPETICOES = 100_000
+TAMANHO_LOTE = 100
+
+
+def _medir(funcao, *args) -> float:
+    """Devolve o custo médio por chamada, em microssegundos."""
+    total = timeit.timeit(lambda: funcao(*args), number=REPETICOES)
+    return total / REPETICOES * 1e6
+
+
+def main() -> None:
+    lugar_id, estado = 1234, "OCUPADO"
+
+    texto = codificar("UPDATE", id=lugar_id, estado=estado)
+    binario = codificar_update_binario(lugar_id, estado)
+
+    itens = [(i, "LIVRE" if i % 2 else "OCUPADO") for i in range(1, TAMANHO_LOTE + 1)]
+    lote_texto = codificar("MUPDATE", itens=itens)
+    lote_binario = codificar_mupdate_binario(itens)
+
+    print("Bytes por UPDATE (com enquadramento de 4 bytes)")
+    print(f"  texto  : {len(enquadrar(texto)):4d}  {texto!r}")
+    print(f"  binário: {len(enquadrar(binario)):4d}  {binario!r}")
+    print(f"Bytes por UPDATE dentro de um MUPDATE de {TAMANHO_LOTE} itens")
+    print(f"  texto  : {len(enquadrar(lote_texto)) / TAMANHO_LOTE:6.2f}")
+    print(f"  binário: {len(enquadrar(lote_binario)) / TAMANHO_LOTE:6.2f}")
+
+    print(f"Custo de descodificação por mensagem ({REPETICOES} repetições)")
+    t_texto = _medir(lambda m: descodificar(m.decode().strip()), texto.encode())
+    t_binario = _medir(descodificar_binario, binario)
+    print(f"  texto  : {t_texto:6.3f} µs")
+    print(f"  binário: {t_binario:6.3f} µs  ({t_texto / t_binario:.1f}x mais rápido)")
+
+    print(f"Custo de descodificação por UPDATE num MUPDATE de {TAMANHO_LOTE} itens")
+    t_lote_texto = _medir(descodificar, lote_texto) / TAMANHO_LOTE
+    t_lote_binario = _medir(descodificar_binario, lote_binario) / TAMANHO_LOTE
+    print(f"  texto  : {t_lote_texto:6.3f} µs")
+    print(f"  binário: {t_lote_binario:6.3f} µs")
+
+
+if __name__ == "__main__":
+    main()
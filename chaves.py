@@ -0,0 +1,117 @@
+# chaves.py
+"""Chave privada do Parque e último certificado do Gestor guardados em disco (arranque rápido)."""
+
+import datetime
+import os
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.x509 import load_pem_x509_certificate
+
+try:  # Permite usar o módulo diretamente (ex: benchmarks) ou como parte do pacote FSD
+    from FSD.assinatura import chave_corresponde
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    from assinatura import chave_corresponde
+
+FICHEIRO_CHAVE = "chave.pem"            # PKCS8 cifrado com a senha
+FICHEIRO_CERTIFICADO = "certificado.pem"
+
+
+class ArmazemChaves:
+    """
+    Uma diretoria com a chave privada (PEM PKCS8, cifrada com `senha`) e o
+    último certificado recebido de /parque_certificado. No arranque, o Parque
+    reutiliza-os em vez de gerar uma chave nova e esperar pelo Gestor.
+
+    A idade da chave é a do ficheiro (é reescrito a cada rotação). Um
+    certificado só é reutilizado se for da chave guardada e ainda não expirou.
+    """
+
+    def __init__(self, diretoria: str, senha: bytes):
+        if not senha:
+            raise ValueError("É precisa uma senha para cifrar a chave privada")
+        self.diretoria = diretoria
+        self._senha = senha
+        os.makedirs(diretoria, mode=0o700, exist_ok=True)
+
+    def _caminho(self, nome: str) -> str:
+        return os.path.join(self.diretoria, nome)
+
+    def carregar(self, algoritmo: str):
+        """
+        (chave privada, certificado PEM ou None), ou (None, None) se não houver
+        chave guardada do `algoritmo` pedido. Lança ValueError se a senha estiver errada.
+        """
+        try:
+            with open(self._caminho(FICHEIRO_CHAVE), "rb") as f:
+                chave = serialization.load_pem_private_key(f.read(), password=self._senha)
+        except FileNotFoundError:
+            return None, None
+        if not chave_corresponde(chave.public_key(), algoritmo):
+            return None, None  # ALGORITMO_ASSINATURA mudou desde que foi guardada
+        return chave, self._certificado_valido(chave)
+
+    def _certificado_valido(self, chave) -> str | None:
+        try:
+            with open(self._caminho(FICHEIRO_CERTIFICADO), "r", encoding="utf-8") as f:
+                certificado = f.read().strip()
+        except FileNotFoundError:
+            return None
+        if validade_certificado(certificado, chave) is None:
+            return None
+        return certificado
+
+    def idade_chave(self) -> float:
+        """Segundos desde que a chave guardada foi gerada (infinito se não houver)."""
+        try:
+            return time.time() - os.path.getmtime(self._caminho(FICHEIRO_CHAVE))
+        except FileNotFoundError:
+            return float("inf")
+
+    def guardar_chave(self, chave) -> None:
+        """Guarda a chave cifrada e apaga o certificado, que era da chave anterior."""
+        dados = chave.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.BestAvailableEncryption(self._senha),
+        )
+        self._escrever(FICHEIRO_CHAVE, dados)
+        try:
+            os.remove(self._caminho(FICHEIRO_CERTIFICADO))
+        except FileNotFoundError:
+            pass
+
+    def guardar_certificado(self, certificado: str) -> None:
+        self._escrever(FICHEIRO_CERTIFICADO, certificado.encode("utf-8"))
+
+    def _escrever(self, nome: str, dados: bytes) -> None:
+        """Ficheiro temporário (só legível pelo dono), fsync e rename atómico."""
+        caminho = self._caminho(nome)
+        temporario = caminho + ".tmp"
+        fd = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, dados)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temporario, caminho)
+
+
+def validade_certificado(certificado: str, chave) -> datetime.datetime | None:
+    """
+    Fim da validade do certificado (UTC), ou None se já expirou, não é PEM
+    válido ou não certifica a chave pública de `chave`.
+    """
+    try:
+        cert = load_pem_x509_certificate(certificado.encode("utf-8"))
+    except ValueError:
+        return None
+
+    formato = (serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    if cert.public_key().public_bytes(*formato) != chave.public_key().public_bytes(*formato):
+        return None
+
+    fim = cert.not_valid_after_utc
+    if fim <= datetime.datetime.now(datetime.timezone.utc):
+        return None
+    return fim
@@ -7,6 +7,13 @@ import json
 import os
 from cryptography.exceptions import InvalidSignature
 
+try:  # Permite correr o cliente diretamente ou como parte do pacote FSD
+    from FSD.assinatura import RSA_PSS, verificar
+    from FSD.merkle import raiz_da_prova
+except ModuleNotFoundError:
+    from assinatura import RSA_PSS, verificar
+    from merkle import raiz_da_prova
+
 
 #  Configurações do Cliente Web
 GESTOR_HOST = "192.168.233.151"
@@ -32,6 +39,10 @@ def validar_resposta_segura(dados):
     Valida a cadeia de confiança e integridade:
       1) Certificado assinado pelo Gestor (PKCS1v15 + SHA256)
       2) Mensagem assinada pelo Parque (PSS + SHA256)
+    O campo "algoritmo" (RSA-PSS, ECDSA-P256 ou Ed25519) escolhe a verificação;
+    sem ele, assume-se RSA como no enunciado.
+    No modo Merkle do Parque, o envelope traz "merkle": {"raiz", "prova"}; a
+    prova tem de levar da mensagem à raiz e é a raiz que está assinada.
     """
     if not GESTOR_PUB_KEY:
         raise Exception("Chave do Gestor em falta")
@@ -43,6 +54,17 @@ def validar_resposta_segura(dados):
     if not cert_pem or not assinatura_cp437 or mensagem is None:
         raise Exception("Dados de segurança incompletos")
 
+    merkle = dados.get("merkle")
+    if merkle is not None:
+        try:
+            msg_bytes = json.dumps(mensagem).encode("utf-8")
+            raiz = raiz_da_prova(msg_bytes, merkle["prova"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise Exception(f"Prova de Merkle malformada: {e}")
+        if raiz != merkle.get("raiz"):
+            raise Exception("Prova de Merkle inválida: a mensagem não pertence ao lote assinado")
+        mensagem = raiz  # o que o Parque assinou foi a raiz
+
     # 1. Validar certificado do Parque com a chave pública do Gestor
     try:
         cert = load_pem_x509_certificate(cert_pem.encode("utf-8"))
@@ -80,6 +102,17 @@ def validar_resposta_segura(dados):
             # se mensagem for string (ou outro), usar regra do enunciado para string
             candidatos_msg.append(str(mensagem).encode("utf-8"))
 
+        algoritmo = dados.get("algoritmo", RSA_PSS)
+        if algoritmo != RSA_PSS:
+            # Algoritmos sem variantes de padding: só as serializações candidatas
+            for msg_bytes in candidatos_msg:
+                try:
+                    verificar(parque_pub_key, algoritmo, sig_bytes, msg_bytes)
+                    return
+                except InvalidSignature:
+                    pass
+            raise Exception(f"Assinatura {algoritmo} inválida")
+
         # paddings a testar
         paddings = [
             ("PSS_MAX", padding.PSS(
@@ -137,6 +170,12 @@ def api_parques():
         erro = {"erro": f"Não foi possível contactar o Gestor de Parques: {e}"}
         return jsonify(erro), 503
 
+# Respostas de /secure/info já validadas, por URL: (ETag, mensagem). Com
+# If-None-Match, um parque sem alterações responde 304 sem corpo e a
+# mensagem guardada é reutilizada sem voltar a validar as assinaturas.
+_cache_info = {}
+
+
 #novos api info e api route para a fase 4
 @app.route("/api/info", methods=["GET"])
 def api_info():
@@ -146,7 +185,11 @@ def api_info():
     # Chama o endpoint seguro /secure/info
     url = f"http://{ip}:{porta}/secure/info"
     try:
-        resp = requests.get(url, timeout=5)
+        guardado = _cache_info.get(url)
+        cabecalhos = {"If-None-Match": guardado[0]} if guardado else {}
+        resp = requests.get(url, headers=cabecalhos, timeout=5)
+        if resp.status_code == 304 and guardado:
+            return jsonify(guardado[1])
         resp.raise_for_status()
         dados = resp.json()
         
@@ -162,6 +205,8 @@ def api_info():
 
         validar_resposta_segura(dados)
 
+        if resp.headers.get("ETag"):
+            _cache_info[url] = (resp.headers["ETag"], mensagem)
         return jsonify(mensagem)
         # Executa validação
         #validar_resposta_segura(dados)
@@ -213,6 +258,30 @@ def api_custo():
         return jsonify({"erro": f"Erro ao calcular custo: {e}"}), 503
 
 
+@app.route("/api/custo/lote", methods=["GET"])
+def api_custo_lote():
+    """
+    Curva de preços de um parque: reencaminha ?tempos= ou ?de=&ate=&passo=
+    para /secure/custo/lote e valida a assinatura (uma só, para o lote inteiro).
+    """
+    ip = request.args.get("ip")
+    porta = request.args.get("porta")
+    params = {
+        k: v for k, v in request.args.items() if k in ("tempos", "de", "ate", "passo")
+    }
+
+    url = f"http://{ip}:{porta}/secure/custo/lote"
+    try:
+        resp = requests.get(url, params=params, timeout=5)
+        resp.raise_for_status()
+        dados = resp.json()
+        validar_resposta_segura(dados)
+        mensagem = dados["mensagem"]
+        return jsonify({"tempos": mensagem["tempos"], "valores": mensagem["valores"]})
+    except Exception as e:
+        return jsonify({"erro": f"Erro ao calcular custos: {e}"}), 503
+
+
 #  Interface Web (frontend)
 @app.route("/", methods=["GET"])
 def index():
@@ -4,13 +4,58 @@ HOST = "10.8.0.181"     #IP da máquina onde corre o servidor
 PORT = 54321
 CAPACIDADE = 25         #Capacidade total do parque (máximo absoluto)
 
+# Modo do servidor TCP dos Lugares:
+#   "threads" -> uma thread por ligação (modo original)
+#   "asyncio" -> um único event loop com corrotinas (dezenas de milhares de ligações)
+MODO_TCP = "threads"
+BACKLOG_TCP = 4096            # tamanho da fila de ligações pendentes (modo asyncio)
+MUPDATE_MAX_ITENS = 1000      # itens por MUPDATE (acima disto: ERRO, sem aplicar nenhum)
+PROCESSOS_TCP = 1             # >1: vários processos com SO_REUSEPORT e estado em memória partilhada (Linux)
+INTERVALO_MONITOR_LOOP = 0.5  # segundos entre medições do atraso do event loop
+FATIAS_LOCK = 16              # nº de locks em que se divide o estado dos lugares
+INTERVALO_SNAPSHOT = 0.1      # intervalo mínimo (s) entre snapshots publicados para a API REST
+INTERVALO_PING_SSE = 15       # segundos sem alterações até enviar um comentário de keep-alive em /stream
+ESPERA_MAX_LUGARES = 30       # limite (s) do long-polling em /lugares?desde=...&espera=...
+CACHE_CONTROL = "no-cache"    # respostas com ETag: guardar, mas revalidar sempre (If-None-Match -> 304)
+ALGORITMO_ASSINATURA = "RSA-PSS"  # chave do Parque: "RSA-PSS" (enunciado), "ECDSA-P256" ou "Ed25519"
+CHAVES_DIRETORIO = None       # None -> chave nova em cada arranque; caminho -> chave (cifrada) e certificado guardados
+CHAVES_SENHA_ENV = "FSD_PARQUE_SENHA"  # variável de ambiente com a senha que cifra a chave guardada
+CHAVE_VALIDADE_DIAS = 30      # idade a partir da qual a chave é substituída (com novo certificado) em segundo plano
+CACHE_ASSINATURAS_MAX = 256   # mensagens assinadas guardadas (LRU) para /secure/*
+ASSINATURA_TRABALHADORES = 2  # threads que fazem as assinaturas (limite de cores ocupados por /secure/* e pela tabela de custos)
+ASSINATURA_FILA_MAX = 256     # assinaturas pendentes acima das quais /secure/* responde 503
+ASSINATURA_ESPERA_MAX = 5.0   # segundos que um pedido seguro espera pela sua assinatura
+CUSTO_LOTE_MAX = 2000         # durações por pedido em /custo/lote e /secure/custo/lote
+TARIFAS_PRECOMPUTADAS_MAX = 5000  # valores distintos de /secure/custo assinados no arranque (acima disto só o LRU)
+TARIFAS_POR_TAREFA = 8        # custos assinados por tarefa de fundo (atraso máximo de um pedido que chegue a meio)
+ASSINATURA_MERKLE = False     # True -> /secure/* assinam em lote (árvore de Merkle, uma assinatura por lote)
+JANELA_LOTE_ASSINATURA = 0.005  # segundos durante os quais se juntam mensagens no mesmo lote
+
+# Diário de eventos (recuperação após reinício)
+DIARIO_DIRETORIO = None       # None -> desativado; caminho -> diretoria com o diário
+DIARIO_INTERVALO_FSYNC = 0.05 # segundos entre fsyncs em grupo (eventos em risco numa falha do sistema)
+DIARIO_INTERVALO_INSTANTANEO = 300        # segundos entre instantâneos (se houve eventos)
+DIARIO_MAX_SEGMENTO = 8 * 1024 * 1024     # bytes de eventos que antecipam o instantâneo seguinte
+
+# Histórico de ocupação (/historico): (resolução em segundos, nº de intervalos guardados)
+HISTORICO_NIVEIS = ((1, 3600), (60, 1440), (3600, 720))  # 1 h a 1 s, 24 h a 1 min, 30 dias a 1 h
+
 # Parâmetros de Simulação
 
 PO = 0.25  # probabilidade de passar LIVRE -> OCUPADO
 PL = 0.15  # probabilidade de passar OCUPADO -> LIVRE
 INTERVALO_SIMULACAO = 20  # segundos entre cada atualização
+FORMATO_LUGAR = "texto"   # formato pedido no INIT: "texto" ou "binario" (com texto como fallback)
+PREVISAO_PESO_PRIOR = 10  # passos fictícios com PO/PL na estimativa das taxas de cada lugar (/previsao)
 
 
 # Opções de Depuração
 LOG_VERBOSO = True
+LOG_NIVEL = "INFO"            # DEBUG, INFO, AVISO ou ERRO
+LOG_FICHEIRO = None           # None -> stdout; caminho -> ficheiro rotativo
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_FILA_MAX = 10_000         # mensagens em espera; acima disto são descartadas (e contadas)
+LOG_AMOSTRAGEM = 1            # regista 1 em cada N mensagens dos sensores (1 = todas)
+VERIFICAR_CONTADORES = False  # recontagem completa a cada transição (só para depuração)
 LUGARES_CLIENTE = 10
\ No newline at end of file
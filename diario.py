@@ -0,0 +1,377 @@
+# diario.py
+"""Diário (journal) append-only dos eventos do parque, para recuperação após reinício."""
+
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+import numpy as np
+
+try:  # Permite usar o módulo diretamente (ex: benchmarks) ou como parte do pacote FSD
+    from FSD.armazem import CODIGOS, LIVRE, OCUPADO
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    from armazem import CODIGOS, LIVRE, OCUPADO
+
+# Um diário é uma diretoria com segmentos numerados, cada um com dois ficheiros append-only:
+#   nomes.N.bin   -> um registo por INIT de um nome novo: id (uint32), tamanho (uint16), nome utf-8
+#   estados.N.bin -> um registo de tamanho fixo por mudança de estado: id (uint32), código (uint32)
+# As desconexões ficam em estados.N.bin como passagens a LIVRE dos lugares do cliente.
+#
+# instantaneo.N.bin guarda o estado completo no início do segmento N (ver gravar_instantaneo):
+# a recuperação lê o último instantâneo e só reproduz os segmentos a partir de N.
+PREFIXO_NOMES = "nomes"
+PREFIXO_ESTADOS = "estados"
+PREFIXO_INSTANTANEO = "instantaneo"
+_FICHEIRO = re.compile(r"^(nomes|estados|instantaneo)\.(\d+)\.bin$")
+
+_NOME = struct.Struct("<IH")
+_ESTADO = struct.Struct("<II")
+_NATIVO_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# Instantâneo: cabeçalho, vetor de estados (capacidade + 1 bytes) e registos de nomes
+_MAGICO = b"FSDI"
+_VERSAO_FORMATO = 1
+_CABECALHO = struct.Struct("<4sHIII")  # mágico, versão, capacidade, nº de nomes, crc32
+
+
+class Diario:
+    """
+    Cada evento é escrito de imediato com os.write (O_APPEND) por quem altera o
+    estado, ainda com o lock do lugar: a ordem no ficheiro é a ordem em memória,
+    mesmo com vários processos (fork) a escrever no mesmo ficheiro.
+
+    O fsync é feito em grupo por uma thread, no máximo a cada `intervalo_fsync`
+    segundos, e cobre as escritas de todos os processos. Uma falha do processo
+    não perde eventos; uma falha do sistema perde no máximo esse intervalo.
+
+    O número do segmento atual está em memória partilhada: quando o processo
+    principal muda de segmento (rodar), os restantes processos reabrem os
+    ficheiros na escrita seguinte.
+    """
+
+    def __init__(self, diretoria: str, intervalo_fsync: float = 0.05):
+        self.diretoria = diretoria
+        self.intervalo_fsync = intervalo_fsync
+        os.makedirs(diretoria, exist_ok=True)
+
+        existentes = _listar(diretoria)
+        ultimo = max((n for numeros in existentes.values() for n in numeros), default=0)
+        self._segmento_partilhado = multiprocessing.RawValue("q", ultimo)
+        self._segmento = None
+        self._fd_nomes = self._fd_estados = None
+        self._lock_fds = threading.Lock()    # troca dos descritores (curto: sem I/O em disco)
+        self._lock_fsync = threading.Lock()  # fsync em curso vs fecho de descritores antigos
+        self._abrir(ultimo)
+
+        self.fsyncs = 0
+        self.instantaneos = 0
+        self._parar = threading.Event()
+        self._thread = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._depois_do_fork)
+
+    def _depois_do_fork(self) -> None:
+        # Os locks podiam estar adquiridos pela thread de fsync, que não existe no filho
+        self._lock_fds = threading.Lock()
+        self._lock_fsync = threading.Lock()
+
+    @property
+    def segmento(self) -> int:
+        return self._segmento_partilhado.value
+
+    def _caminho(self, prefixo: str, segmento: int) -> str:
+        return os.path.join(self.diretoria, f"{prefixo}.{segmento:06d}.bin")
+
+    def _abrir(self, segmento: int) -> tuple:
+        """
+        Passa a escrever nos ficheiros do segmento. Só abre e troca os
+        descritores: devolve os anteriores, que quem chama fecha (ver fechar_fds)
+        fora de qualquer lock de escrita.
+        """
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        fd_nomes = os.open(self._caminho(PREFIXO_NOMES, segmento), flags, 0o644)
+        fd_estados = os.open(self._caminho(PREFIXO_ESTADOS, segmento), flags, 0o644)
+        anteriores = tuple(fd for fd in (self._fd_nomes, self._fd_estados) if fd is not None)
+        self._fd_nomes, self._fd_estados, self._segmento = fd_nomes, fd_estados, segmento
+        return anteriores
+
+    def _fds(self) -> tuple[int, int]:
+        if self._segmento_partilhado.value != self._segmento:
+            with self._lock_fds:
+                if self._segmento_partilhado.value != self._segmento:
+                    anteriores = self._abrir(self._segmento_partilhado.value)
+                    # Processo filho: o principal faz o fsync do segmento anterior
+                    # (depois de rodar, ninguém lhe escreve), basta fechar
+                    for fd in anteriores:
+                        os.close(fd)
+        return self._fd_nomes, self._fd_estados
+
+    #  Escrita (chamar com o lock que protege a alteração)
+    def registar_nome(self, lugar_id: int, nome: str) -> None:
+        dados = nome.encode("utf-8")
+        os.write(self._fds()[0], _NOME.pack(lugar_id, len(dados)) + dados)
+
+    def registar_estado(self, lugar_id: int, estado: str) -> None:
+        os.write(self._fds()[1], _ESTADO.pack(lugar_id, CODIGOS[estado]))
+
+    def registar_estados(self, pares) -> None:
+        """Vários pares (id, estado) numa única escrita (ex: MUPDATE, desconexão)."""
+        registos = array("I")
+        for lugar_id, estado in pares:
+            registos.append(lugar_id)
+            registos.append(CODIGOS[estado])
+        if registos:
+            if not _NATIVO_LITTLE_ENDIAN:
+                registos.byteswap()
+            os.write(self._fds()[1], registos.tobytes())
+
+    #  Group commit
+    def iniciar(self) -> None:
+        """Arranca a thread de fsync (só no processo principal: o fsync serve todos)."""
+        self._thread = threading.Thread(target=self._sincronizar, name="diario", daemon=True)
+        self._thread.start()
+
+    def _sincronizar(self) -> None:
+        tamanhos = None
+        while not self._parar.wait(self.intervalo_fsync):
+            # Lê os descritores atuais e faz o fsync sem _lock_fds (rodar não
+            # espera pelo disco); _lock_fsync impede que fechar_fds os feche
+            # a meio (no processo principal o segmento só muda em rodar())
+            with self._lock_fsync:
+                with self._lock_fds:
+                    segmento, fds = self._segmento, (self._fd_nomes, self._fd_estados)
+                # Só faz fsync se algum processo escreveu desde o último
+                atuais = (segmento, *(os.fstat(fd).st_size for fd in fds))
+                if atuais != tamanhos:
+                    for fd in fds:
+                        os.fsync(fd)
+                    tamanhos = atuais
+                    self.fsyncs += 1
+
+    def fechar_fds(self, fds) -> None:
+        """fsync e fecho dos descritores de um segmento anterior (devolvidos por rodar)."""
+        with self._lock_fsync:
+            for fd in fds:
+                os.fsync(fd)
+                os.close(fd)
+
+    def tamanho_segmento(self) -> int:
+        """Bytes de eventos de estado no segmento atual (escritos por todos os processos)."""
+        return os.path.getsize(self._caminho(PREFIXO_ESTADOS, self.segmento))
+
+    def fechar(self) -> None:
+        """Último fsync e fecho dos ficheiros."""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for fd in (self._fd_nomes, self._fd_estados):
+            try:
+                os.fsync(fd)
+                os.close(fd)
+            except OSError:
+                pass
+
+    #  Instantâneos e compactação
+    def rodar(self) -> tuple[int, tuple]:
+        """
+        Começa um novo segmento e devolve (número, descritores anteriores).
+        Chamar com todos os locks de escrita, para que o estado copiado a
+        seguir corresponda exatamente ao fim do segmento anterior; por isso
+        só abre os novos ficheiros e troca os descritores. O fsync e o fecho
+        dos anteriores (fechar_fds) fazem-se depois de libertar esses locks.
+        """
+        with self._lock_fds:
+            novo = self._segmento_partilhado.value + 1
+            self._segmento_partilhado.value = novo
+            anteriores = self._abrir(novo)
+        return novo, anteriores
+
+    def gravar_instantaneo(self, segmento: int, estados: bytes, nomes: dict[str, int]) -> int:
+        """
+        Grava o estado no início de `segmento` (ficheiro temporário, fsync e
+        rename atómico) e apaga os segmentos e instantâneos anteriores, que
+        deixam de ser precisos para a recuperação. Devolve o tamanho em bytes.
+        """
+        registos = bytearray()
+        for nome, lugar_id in nomes.items():
+            dados = nome.encode("utf-8")
+            registos += _NOME.pack(lugar_id, len(dados))
+            registos += dados
+        crc = zlib.crc32(registos, zlib.crc32(estados))
+        cabecalho = _CABECALHO.pack(_MAGICO, _VERSAO_FORMATO, len(estados) - 1, len(nomes), crc)
+
+        caminho = self._caminho(PREFIXO_INSTANTANEO, segmento)
+        temporario = caminho + ".tmp"
+        with open(temporario, "wb") as f:
+            f.write(cabecalho)
+            f.write(estados)
+            f.write(registos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+        _sincronizar_diretoria(self.diretoria)
+
+        self._apagar_anteriores(segmento)
+        self.instantaneos += 1
+        return _CABECALHO.size + len(estados) + len(registos)
+
+    def _apagar_anteriores(self, segmento: int) -> None:
+        for prefixo, numeros in _listar(self.diretoria).items():
+            for n in numeros:
+                if n < segmento:
+                    os.remove(self._caminho(prefixo, n))
+
+    #  Recuperação
+    def reproduzir(self, capacidade: int) -> tuple[dict[str, int], bytes]:
+        """
+        Lê o último instantâneo e os segmentos seguintes (mmap) e devolve
+        (nome -> id, vetor de estados), em que o vetor tem o último código de
+        estado de cada ID (0 se não houver eventos). IDs acima da capacidade
+        (se esta tiver diminuído) são ignorados.
+
+        Um registo incompleto no fim de um segmento (escrita interrompida) é
+        ignorado e cortado do ficheiro, para que os próximos eventos fiquem alinhados.
+        """
+        existentes = _listar(self.diretoria)
+        base = max(existentes[PREFIXO_INSTANTANEO], default=None)
+
+        vetor = np.zeros(capacidade + 1, dtype=np.uint8)
+        nomes = {}
+        if base is not None:
+            nomes = _ler_instantaneo(self._caminho(PREFIXO_INSTANTANEO, base), vetor)
+            # Restos de uma compactação interrompida antes de apagar os ficheiros antigos
+            self._apagar_anteriores(base)
+
+        segmentos = sorted(
+            set(existentes[PREFIXO_NOMES] + existentes[PREFIXO_ESTADOS])
+        )
+        for segmento in segmentos:
+            if base is not None and segmento < base:
+                continue
+
+            caminho = self._caminho(PREFIXO_NOMES, segmento)
+            if os.path.exists(caminho):
+                lidos, validos = _ler_nomes(caminho)
+                nomes.update(lidos)
+                _cortar(caminho, validos)
+
+            caminho = self._caminho(PREFIXO_ESTADOS, segmento)
+            if os.path.exists(caminho):
+                _cortar(caminho, _ler_estados(caminho, vetor))
+
+        nomes = {nome: lid for nome, lid in nomes.items() if lid <= capacidade}
+        return nomes, vetor.tobytes()
+
+
+def _listar(diretoria: str) -> dict[str, list[int]]:
+    """Números de segmento existentes, por tipo de ficheiro."""
+    existentes = {PREFIXO_NOMES: [], PREFIXO_ESTADOS: [], PREFIXO_INSTANTANEO: []}
+    for ficheiro in os.listdir(diretoria):
+        encontrado = _FICHEIRO.match(ficheiro)
+        if encontrado:
+            existentes[encontrado.group(1)].append(int(encontrado.group(2)))
+    return existentes
+
+
+def _sincronizar_diretoria(diretoria: str) -> None:
+    """fsync da diretoria, para que o rename sobreviva a uma falha do sistema (POSIX)."""
+    try:
+        fd = os.open(diretoria, os.O_RDONLY)
+    except OSError:  # Windows: não é possível abrir diretorias
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _cortar(caminho: str, validos: int) -> None:
+    if validos < os.path.getsize(caminho):
+        os.truncate(caminho, validos)
+
+
+def _mapear(caminho: str):
+    """mmap só de leitura (None se o ficheiro estiver vazio)."""
+    with open(caminho, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _ler_registos_nomes(dados, pos: int, fim: int) -> tuple[dict[str, int], int]:
+    """Lê registos de nomes de dados[pos:fim]; devolve os nomes e a posição do primeiro incompleto."""
+    nomes = {}
+    while pos + _NOME.size <= fim:
+        lugar_id, tamanho = _NOME.unpack_from(dados, pos)
+        seguinte = pos + _NOME.size + tamanho
+        if seguinte > fim:
+            break
+        nomes[bytes(dados[pos + _NOME.size:seguinte]).decode("utf-8")] = lugar_id
+        pos = seguinte
+    return nomes, pos
+
+
+def _ler_nomes(caminho: str) -> tuple[dict[str, int], int]:
+    mapa = _mapear(caminho)
+    if mapa is None:
+        return {}, 0
+    with mapa:
+        return _ler_registos_nomes(mapa, 0, len(mapa))
+
+
+def _ler_instantaneo(caminho: str, vetor: np.ndarray) -> dict[str, int]:
+    """Carrega um instantâneo para `vetor` e devolve os nomes (ValueError se estiver corrompido)."""
+    with open(caminho, "rb") as f:
+        dados = f.read()
+
+    magico, versao, capacidade, n_nomes, crc = _CABECALHO.unpack_from(dados)
+    if magico != _MAGICO or versao != _VERSAO_FORMATO:
+        raise ValueError(f"{caminho}: não é um instantâneo do diário")
+    conteudo = memoryview(dados)[_CABECALHO.size:]
+    if zlib.crc32(conteudo) != crc:
+        raise ValueError(f"{caminho}: instantâneo corrompido (crc32)")
+
+    estados = np.frombuffer(conteudo, dtype=np.uint8, count=capacidade + 1)
+    comum = min(len(vetor), len(estados))
+    vetor[:comum] = estados[:comum]
+
+    nomes, _ = _ler_registos_nomes(conteudo, capacidade + 1, len(conteudo))
+    if len(nomes) != n_nomes:
+        raise ValueError(f"{caminho}: número de nomes inesperado")
+    return nomes
+
+
+def _ler_estados(caminho: str, vetor: np.ndarray) -> int:
+    """
+    Aplica os eventos de um segmento a `vetor` e devolve os bytes válidos.
+
+    Os registos têm tamanho fixo, por isso o ficheiro é lido diretamente como
+    um vetor NumPy (sem copiar nem percorrer os eventos em Python). Para cada
+    ID fica o código do seu último evento: np.maximum.at guarda a posição do
+    evento mais recente de cada ID, mesmo com IDs repetidos.
+    """
+    mapa = _mapear(caminho)
+    if mapa is None:
+        return 0
+
+    capacidade = len(vetor) - 1
+    with mapa:
+        validos = len(mapa) - len(mapa) % _ESTADO.size
+        registos = np.frombuffer(mapa, dtype="<u4", count=validos // 4).reshape(-1, 2)
+        ids, codigos = registos[:, 0], registos[:, 1]
+        aceites = (ids <= capacidade) & ((codigos == LIVRE) | (codigos == OCUPADO))
+        # A indexação booleana copia: o mmap pode ser fechado a seguir
+        ids, codigos = ids[aceites], codigos[aceites]
+        del registos, aceites
+
+    ultimo = np.full(capacidade + 1, -1, dtype=np.int64)
+    np.maximum.at(ultimo, ids, np.arange(len(ids)))
+    com_eventos = ultimo >= 0
+    vetor[com_eventos] = codigos[ultimo[com_eventos]]
+    return validos
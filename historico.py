@@ -0,0 +1,134 @@
+# historico.py
+"""Histórico de ocupação em memória fixa: buffers circulares NumPy a várias resoluções."""
+
+import threading
+
+import numpy as np
+
+# Níveis por omissão: (resolução em segundos, nº de intervalos guardados)
+#   1 s durante 1 hora, 1 min durante 24 horas, 1 h durante 30 dias
+NIVEIS = ((1, 3600), (60, 1440), (3600, 720))
+NOMES_RESOLUCAO = {"1s": 1, "1min": 60, "1h": 3600}
+
+
+class _Nivel:
+    """Buffer circular de uma resolução: um intervalo por posição (índice % tamanho)."""
+
+    def __init__(self, resolucao: int, tamanho: int):
+        self.resolucao = resolucao
+        self.tamanho = tamanho
+        self.intervalo = np.full(tamanho, -1, dtype=np.int64)  # nº do intervalo guardado
+        self.minimo = np.zeros(tamanho, dtype=np.int64)
+        self.maximo = np.zeros(tamanho, dtype=np.int64)
+        self.soma = np.zeros(tamanho, dtype=np.int64)
+        self.amostras = np.zeros(tamanho, dtype=np.int64)
+        self.transicoes = np.zeros(tamanho, dtype=np.int64)
+
+    def registar(self, instante: float, ocupados: int, transicoes: int) -> None:
+        intervalo = int(instante) // self.resolucao
+        i = intervalo % self.tamanho
+        if self.intervalo[i] != intervalo:
+            # Posição reutilizada: o intervalo antigo saiu da janela
+            self.intervalo[i] = intervalo
+            self.minimo[i] = self.maximo[i] = ocupados
+            self.soma[i] = self.amostras[i] = self.transicoes[i] = 0
+        else:
+            self.minimo[i] = min(self.minimo[i], ocupados)
+            self.maximo[i] = max(self.maximo[i], ocupados)
+        self.soma[i] += ocupados
+        self.amostras[i] += 1
+        self.transicoes[i] += transicoes
+
+
+class HistoricoOcupacao:
+    """
+    Amostras de ocupação (e nº de transições de estado entre amostras)
+    agregadas por intervalo em cada nível: mínimo, máximo, soma e nº de
+    amostras. A memória é fixa, os intervalos mais antigos são substituídos.
+
+    As consultas reagregam os intervalos de um nível para a resolução pedida
+    com operações vetoriais (reduceat), sem percorrer amostras em Python.
+    """
+
+    def __init__(self, niveis=NIVEIS):
+        self._niveis = [_Nivel(resolucao, tamanho) for resolucao, tamanho in niveis]
+        self._lock = threading.Lock()
+
+    @property
+    def resolucoes(self) -> list[int]:
+        return [nivel.resolucao for nivel in self._niveis]
+
+    def registar(self, instante: float, ocupados: int, transicoes: int = 0) -> None:
+        """Acrescenta uma amostra a todos os níveis."""
+        with self._lock:
+            for nivel in self._niveis:
+                nivel.registar(instante, ocupados, transicoes)
+
+    def _escolher_nivel(self, desde: float, resolucao: int) -> _Nivel:
+        """
+        Nível mais detalhado que ainda guarda `desde` e cuja resolução divide a
+        pedida; se nenhum guardar `desde`, o que guarda mais tempo.
+        """
+        candidatos = [n for n in self._niveis if resolucao % n.resolucao == 0]
+        if not candidatos:
+            raise ValueError(f"Resolução {resolucao}s não é múltipla de {self.resolucoes}")
+        for nivel in candidatos:
+            ultimo = int(nivel.intervalo.max())
+            # Início do intervalo mais antigo que o nível ainda pode guardar
+            if ultimo < 0 or (ultimo - nivel.tamanho + 1) * nivel.resolucao <= desde:
+                return nivel
+        return candidatos[-1]
+
+    def consultar(self, desde: float, ate: float, resolucao: int) -> list[dict]:
+        """
+        Intervalos de `resolucao` segundos em [desde, ate), por ordem, cada um
+        com instante (início), mínimo, máximo, média de ocupados e transições.
+        """
+        if resolucao <= 0 or ate <= desde:
+            raise ValueError("Intervalo ou resolução inválidos")
+
+        with self._lock:
+            nivel = self._escolher_nivel(desde, resolucao)
+            inicio = nivel.intervalo * nivel.resolucao
+            validos = (nivel.intervalo >= 0) & (inicio >= desde) & (inicio < ate)
+            ordem = np.argsort(inicio[validos], kind="stable")
+            inicio = inicio[validos][ordem]
+            minimo = nivel.minimo[validos][ordem]
+            maximo = nivel.maximo[validos][ordem]
+            soma = nivel.soma[validos][ordem]
+            amostras = nivel.amostras[validos][ordem]
+            transicoes = nivel.transicoes[validos][ordem]
+
+        if len(inicio) == 0:
+            return []
+
+        # Agrupa intervalos consecutivos que caem no mesmo intervalo pedido
+        grupo = inicio // resolucao
+        limites = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]])
+        soma = np.add.reduceat(soma, limites)
+        amostras = np.add.reduceat(amostras, limites)
+
+        return [
+            {
+                "instante": int(t),
+                "min": int(mn),
+                "max": int(mx),
+                "media": round(float(s) / float(a), 2),
+                "transicoes": int(tr),
+            }
+            for t, mn, mx, s, a, tr in zip(
+                grupo[limites] * resolucao,
+                np.minimum.reduceat(minimo, limites),
+                np.maximum.reduceat(maximo, limites),
+                soma,
+                amostras,
+                np.add.reduceat(transicoes, limites),
+            )
+        ]
+
+
+def resolucao_em_segundos(valor: str) -> int:
+    """Aceita "1s", "1min", "1h" ou um número de segundos."""
+    if valor in NOMES_RESOLUCAO:
+        return NOMES_RESOLUCAO[valor]
+    return int(valor)
@@ -20,39 +20,87 @@ try:  # Permite executar o script diretamente ou como módulo do pacote FSD
         PO,
         PORT,
         LUGARES_CLIENTE,
+        FORMATO_LUGAR,
+    )
+    from FSD.protocolo import (
+        FORMATO_BINARIO,
+        FORMATO_TEXTO,
+        DescodificadorStream,
+        codificar,
+        codificar_update_binario,
+        descodificar_mensagem,
+        e_binaria,
+        enquadrar,
     )
-    from FSD.protocolo import codificar, descodificar
 except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-    from config import CAPACIDADE, HOST, INTERVALO_SIMULACAO, PL, PO, PORT
-    from protocolo import codificar, descodificar
+    from config import CAPACIDADE, FORMATO_LUGAR, HOST, INTERVALO_SIMULACAO, PL, PO, PORT
+    from protocolo import (
+        FORMATO_BINARIO,
+        FORMATO_TEXTO,
+        DescodificadorStream,
+        codificar,
+        codificar_update_binario,
+        descodificar_mensagem,
+        e_binaria,
+        enquadrar,
+    )
+
+
+BUFFER_SIZE = 4096
+
 
+def _receber_resposta(sock: socket.socket, descodificador: DescodificadorStream) -> bytes:
+    """Devolve a próxima mensagem completa enviada pelo Parque."""
+    while (mensagem := descodificador.proxima()) is None:
+        dados = sock.recv(BUFFER_SIZE)
+        if not dados:
+            raise ConnectionError("Ligação encerrada pelo Parque!")
+        descodificador.alimentar(dados)
+    return mensagem
 
-BUFFER_SIZE = 1024
 
+def _enviar_pedidos(
+    sock: socket.socket, descodificador: DescodificadorStream, mensagens: list[str | bytes]
+) -> list[bytes]:
+    """
+    Envia vários pedidos de uma só vez (pipelining) e devolve as respostas,
+    pela mesma ordem dos pedidos.
+    """
+    sock.sendall(b"".join(enquadrar(m) for m in mensagens))
+    return [_receber_resposta(sock, descodificador) for _ in mensagens]
 
-def _receber_resposta(sock: socket.socket) -> str:
-    """Devolve a mensagem enviada pelo Parque."""
-    dados = sock.recv(BUFFER_SIZE)
-    if not dados:
-        raise ConnectionError("Ligação encerrada pelo Parque!")
-    return dados.decode().strip()
 
+def _mostrar(resposta: bytes) -> str:
+    """Representação legível de uma resposta, seja de texto ou binária."""
+    if e_binaria(resposta):
+        return str(descodificar_mensagem(resposta))
+    return resposta.decode().strip()
 
-def _obter_id(sock: socket.socket, nome_lugar: str) -> int:
-    """Envia o pedido INIT com o nome do lugar e devolve o ID atribuído."""
-    sock.sendall(codificar("INIT", nome=nome_lugar).encode())
-    resposta = _receber_resposta(sock)
-    print(f"[SERVIDOR]: {resposta}")
 
-    dados = descodificar(resposta)
+def _obter_id(
+    sock: socket.socket, descodificador: DescodificadorStream, nome_lugar: str
+) -> tuple[int, str]:
+    """
+    Envia o pedido INIT com o nome do lugar e devolve o ID atribuído e o
+    formato aceite pelo Parque (texto se o Parque não suportar o pedido).
+    """
+    if FORMATO_LUGAR == FORMATO_TEXTO:
+        pedido = codificar("INIT", nome=nome_lugar)
+    else:
+        pedido = codificar("INIT", nome=nome_lugar, formato=FORMATO_LUGAR)
+
+    [resposta] = _enviar_pedidos(sock, descodificador, [pedido])
+    print(f"[SERVIDOR]: {_mostrar(resposta)}")
+
+    dados = descodificar_mensagem(resposta)
     if dados.get("comando") == "ERRO":
         print(f"[ERRO] ({nome_lugar}) {dados.get('msg')}")
 
     if dados.get("comando") != "OK" or "id" not in dados:
-        raise ValueError(f"Resposta inesperada ao INIT: {resposta}")
+        raise ValueError(f"Resposta inesperada ao INIT: {_mostrar(resposta)}")
 
-    return int(dados["id"])
+    return int(dados["id"]), dados.get("formato", FORMATO_TEXTO)
 
 
 
@@ -65,7 +113,13 @@ def _proximo_estado(estado_atual: str) -> str:
     return estado_atual
 
 
-def _enviar_atualizacao(sock: socket.socket, lugar_id: int, estado: str) -> None:
+def _enviar_atualizacao(
+    sock: socket.socket,
+    descodificador: DescodificadorStream,
+    lugar_id: int,
+    estado: str,
+    formato: str = FORMATO_TEXTO,
+) -> None:
     """Comunica o estado atual do lugar ao Parque, com possibilidade de erros simulados."""
 
     r = random.random()
@@ -81,16 +135,17 @@ def _enviar_atualizacao(sock: socket.socket, lugar_id: int, estado: str) -> None
     elif r < 0.25:
         # Erro de estado inválido
         mensagem = codificar("UPDATE", id=lugar_id, estado="INVALIDO")
+    elif formato == FORMATO_BINARIO:
+        # Mensagem correta, no formato binário negociado
+        mensagem = codificar_update_binario(lugar_id, estado)
     else:
         # Mensagem correta
         mensagem = codificar("UPDATE", id=lugar_id, estado=estado)
 
-    sock.sendall(mensagem.encode())
-
-    resposta = _receber_resposta(sock)
-    print(f"[SERVIDOR -> Lugar {lugar_id}]: {resposta}")
+    [resposta] = _enviar_pedidos(sock, descodificador, [mensagem])
+    print(f"[SERVIDOR -> Lugar {lugar_id}]: {_mostrar(resposta)}")
 
-    dados = descodificar(resposta)
+    dados = descodificar_mensagem(resposta)
     if dados.get("comando") == "ERRO":
         print(f"[ERRO] Lugar {lugar_id}: {dados.get('msg')}")
 
@@ -105,20 +160,21 @@ def simular_lugar(nome_lugar: str) -> None:
                 print(f"[INFO] ({nome_lugar}) A tentar ligação ao Parque em {HOST}:{PORT}...")
                 sock.connect((HOST, PORT))
                 print(f"[OK] ({nome_lugar}) Ligação estabelecida com o Parque.")
+                descodificador = DescodificadorStream()
 
                 try:
-                    lugar_id = _obter_id(sock, nome_lugar)
+                    lugar_id, formato = _obter_id(sock, descodificador, nome_lugar)
                 except (ConnectionError, ValueError) as exc:
                     print(f"[ERRO] ({nome_lugar}) Falha ao obter ID: {exc}")
                     time.sleep(3)
                     continue
 
-                print(f"[INFO] ({nome_lugar}) Registado com ID {lugar_id}")
+                print(f"[INFO] ({nome_lugar}) Registado com ID {lugar_id} (formato {formato})")
 
                 while True:
                     time.sleep(INTERVALO_SIMULACAO)
                     estado = _proximo_estado(estado)
-                    _enviar_atualizacao(sock, lugar_id, estado)
+                    _enviar_atualizacao(sock, descodificador, lugar_id, estado, formato)
 
         except (ConnectionError, OSError) as exc:
             print(f"[AVISO] ({nome_lugar}) Ligação perdida ({exc}). Nova tentativa em 3 segundos...")
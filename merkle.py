@@ -0,0 +1,137 @@
+# merkle.py
+"""Assinatura em lote: várias mensagens numa árvore de Merkle, com uma só assinatura da raiz."""
+
+import hashlib
+import threading
+import time
+
+# Prefixos diferentes para folhas e nós internos: uma folha nunca se confunde com um nó
+_FOLHA = b"\x00"
+_NO = b"\x01"
+
+
+def hash_folha(mensagem: bytes) -> bytes:
+    return hashlib.sha256(_FOLHA + mensagem).digest()
+
+
+def hash_no(esquerda: bytes, direita: bytes) -> bytes:
+    return hashlib.sha256(_NO + esquerda + direita).digest()
+
+
+def construir(mensagens: list[bytes]) -> tuple[str, list[list]]:
+    """
+    Raiz (hex) da árvore sobre `mensagens` e a prova de inclusão de cada uma:
+    lista de [lado, hash hex] das irmãs, da folha para a raiz ("e" se a irmã
+    está à esquerda, "d" se à direita). Num nível ímpar, o último nó sobe sem
+    ser combinado.
+    """
+    nivel = [hash_folha(m) for m in mensagens]
+    posicoes = list(range(len(mensagens)))  # posição de cada mensagem no nível atual
+    provas: list[list] = [[] for _ in mensagens]
+
+    while len(nivel) > 1:
+        for i, pos in enumerate(posicoes):
+            irma = pos ^ 1
+            if irma < len(nivel):
+                provas[i].append(["e" if irma < pos else "d", nivel[irma].hex()])
+            posicoes[i] = pos // 2
+        nivel = [
+            hash_no(nivel[j], nivel[j + 1]) if j + 1 < len(nivel) else nivel[j]
+            for j in range(0, len(nivel), 2)
+        ]
+
+    return nivel[0].hex(), provas
+
+
+def raiz_da_prova(mensagem: bytes, prova: list) -> str:
+    """Recalcula a raiz (hex) a partir da mensagem e da sua prova de inclusão."""
+    atual = hash_folha(mensagem)
+    for lado, irma in prova:
+        irma = bytes.fromhex(irma)
+        if lado == "e":
+            atual = hash_no(irma, atual)
+        elif lado == "d":
+            atual = hash_no(atual, irma)
+        else:
+            raise ValueError(f"Lado inválido na prova: {lado!r}")
+    return atual.hex()
+
+
+class _Pedido:
+    __slots__ = ("mensagem", "resultado", "erro")
+
+    def __init__(self, mensagem: bytes):
+        self.mensagem = mensagem
+        self.resultado: dict | None = None
+        self.erro: Exception | None = None
+
+
+class AssinadorLotes:
+    """
+    Junta as mensagens pedidas durante `janela` segundos numa árvore de Merkle
+    e assina só a raiz, com `assinar(raiz hex, contexto)`. Cada pedido recebe
+    {"assinatura": ..., "merkle": {"raiz": ..., "prova": [...]}}.
+
+    Só mensagens do mesmo `grupo` partilham um lote (ex: a geração da chave:
+    um lote nunca junta pedidos que esperam chaves diferentes); a raiz é
+    assinada com o `contexto` do primeiro pedido do lote.
+
+    Sem thread própria: o primeiro pedido de cada lote espera a janela, assina
+    e acorda os restantes; quem chega entretanto já começa o lote seguinte.
+    """
+
+    def __init__(self, assinar, janela: float):
+        self._assinar = assinar
+        self._janela = janela
+        self._cond = threading.Condition()
+        self._pendentes: dict[object, list[_Pedido]] = {}
+        self.lotes = 0
+        self.mensagens = 0
+
+    def assinar(self, mensagem: bytes, grupo=None, contexto=None) -> dict:
+        pedido = _Pedido(mensagem)
+        with self._cond:
+            lote = self._pendentes.setdefault(grupo, [])
+            lote.append(pedido)
+            lider = len(lote) == 1
+
+        if lider:
+            time.sleep(self._janela)
+            with self._cond:
+                lote = self._pendentes.pop(grupo)
+            self._assinar_lote(lote, contexto)
+        else:
+            with self._cond:
+                self._cond.wait_for(lambda: pedido.resultado is not None or pedido.erro is not None)
+
+        if pedido.erro is not None:
+            raise pedido.erro
+        return pedido.resultado
+
+    def _assinar_lote(self, lote: list[_Pedido], contexto) -> None:
+        try:
+            raiz, provas = construir([p.mensagem for p in lote])
+            assinatura = self._assinar(raiz, contexto)
+        except Exception as e:
+            with self._cond:
+                for pedido in lote:
+                    pedido.erro = e
+                self._cond.notify_all()
+            return
+
+        with self._cond:
+            for pedido, prova in zip(lote, provas):
+                pedido.resultado = {
+                    "assinatura": assinatura,
+                    "merkle": {"raiz": raiz, "prova": prova},
+                }
+            self.lotes += 1
+            self.mensagens += len(lote)
+            self._cond.notify_all()
+
+    def estatisticas(self) -> dict:
+        return {
+            "lotes": self.lotes,
+            "mensagens": self.mensagens,
+            "media_por_lote": round(self.mensagens / self.lotes, 2) if self.lotes else 0.0,
+        }
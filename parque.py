@@ -1,28 +1,121 @@
 # FSD/parque/parque.py
+import asyncio
+import atexit
+import functools
+import multiprocessing
+import os
 import socket
 import psutil  # pip install psutil
 import requests
 import threading
 import time
 import json
+import math
+import zlib
+from decimal import Decimal, DecimalException, InvalidOperation
+import numpy as np
 from flask import Flask, jsonify, Response, request
-from FSD.config import HOST, PORT, CAPACIDADE, LOG_VERBOSO
+from FSD.config import (
+    HOST,
+    PORT,
+    CAPACIDADE,
+    LOG_VERBOSO,
+    LOG_NIVEL,
+    LOG_FICHEIRO,
+    LOG_MAX_BYTES,
+    LOG_BACKUPS,
+    LOG_FILA_MAX,
+    LOG_AMOSTRAGEM,
+    VERIFICAR_CONTADORES,
+    FATIAS_LOCK,
+    MODO_TCP,
+    PROCESSOS_TCP,
+    BACKLOG_TCP,
+    MUPDATE_MAX_ITENS,
+    INTERVALO_MONITOR_LOOP,
+    INTERVALO_SNAPSHOT,
+    INTERVALO_PING_SSE,
+    ESPERA_MAX_LUGARES,
+    CACHE_CONTROL,
+    ALGORITMO_ASSINATURA,
+    CHAVES_DIRETORIO,
+    CHAVES_SENHA_ENV,
+    CHAVE_VALIDADE_DIAS,
+    CACHE_ASSINATURAS_MAX,
+    ASSINATURA_TRABALHADORES,
+    ASSINATURA_FILA_MAX,
+    ASSINATURA_ESPERA_MAX,
+    TARIFAS_PRECOMPUTADAS_MAX,
+    TARIFAS_POR_TAREFA,
+    CUSTO_LOTE_MAX,
+    ASSINATURA_MERKLE,
+    JANELA_LOTE_ASSINATURA,
+    DIARIO_DIRETORIO,
+    DIARIO_INTERVALO_FSYNC,
+    DIARIO_INTERVALO_INSTANTANEO,
+    DIARIO_MAX_SEGMENTO,
+    HISTORICO_NIVEIS,
+    PO,
+    PL,
+    INTERVALO_SIMULACAO,
+    PREVISAO_PESO_PRIOR,
+)
+from FSD.registo import RegistoAssincrono
+from FSD.diario import Diario
+from FSD.historico import HistoricoOcupacao, resolucao_em_segundos
+from FSD.previsao import EstimadorTransicoes, projetar
+from FSD.respostas import CacheRespostas, serializar
+from FSD.assinatura import (
+    CacheAssinaturas,
+    Credenciais,
+    ServicoAssinatura,
+    ServicoSobrecarregado,
+    assinar,
+    gerar_chave,
+)
+from FSD.merkle import AssinadorLotes, construir
+from FSD.chaves import ArmazemChaves
+from FSD.armazem import NAO_REGISTADO, LIVRE, OCUPADO, ESTADOS, ArmazemLugares, Snapshot, novo_registo_cliente
 from FSD.protocolo import (
     codificar,
     descodificar,
+    enquadrar,
+    DescodificadorStream,
+    FormatoInvalido,
+    FORMATO_TEXTO,
+    FORMATOS_SUPORTADOS,
+    e_binaria,
+    descodificar_binario,
+    codificar_ok_binario,
+    codificar_erro_binario,
     ProtocoloErro,
     ParametrosInvalidos,
     ComandoInvalido,
+    RESULTADOS_BINARIO,
+    TAMANHO_MAX_MENSAGEM,
 )
 
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives import serialization
 
 START_TIME = time.time()
 
 
 #  Classe que representa o Parque
 
+def _altera_estado(metodo):
+    """
+    Marca os métodos que alteram o estado dos lugares: em modo de depuração,
+    confirma os contadores depois de cada alteração.
+    """
+    @functools.wraps(metodo)
+    def envolvido(self, *args, **kwargs):
+        resultado = metodo(self, *args, **kwargs)
+        if VERIFICAR_CONTADORES:
+            self._verificar_contadores()
+        return resultado
+    return envolvido
+
+
 class Parque:
     """Representa um parque de estacionamento com os seus lugares e informações."""
 
@@ -35,6 +128,9 @@ class Parque:
         tarifa_hora: float,
         tarifa_max: float,
         capacidade: int,
+        partilhado: bool = False,
+        diario: Diario | None = None,
+        chaves: ArmazemChaves | None = None,
     ):
         self.nome = nome
         self.localizacao = (latitude, longitude)
@@ -43,75 +139,539 @@ class Parque:
         self.tarifa_max = tarifa_max
         self.capacidade = capacidade
 
-        self.mapa_nomes = {}  # nome_lugar -> id atribuído
-        self.lugares = {}  # id -> estado ("LIVRE" / "OCUPADO")
-        self.id_atual = 1
-        self.lock = threading.Lock()
-
-        # Mapeia cada cliente (addr) para os IDs de lugares que lhe pertencem
+        # Com partilhado=True (vários processos TCP), o registo de nomes e o estado
+        # dos lugares ficam partilhados entre processos criados por fork
+        if partilhado:
+            contexto = multiprocessing.get_context("fork")
+            self._gestor = contexto.Manager()
+            self.mapa_nomes = self._gestor.dict()  # nome_lugar -> id atribuído
+            self.lock = contexto.Lock()
+        else:
+            self.mapa_nomes = {}  # nome_lugar -> id atribuído
+            self.lock = threading.Lock()
+        # Protege o registo (mapa_nomes, atribuição de IDs); o estado usa as fatias
+
+        # id -> estado ("LIVRE" / "OCUPADO"), com locks em fatias para as escritas.
+        # As versões partem do instante de arranque (µs), para que um cursor de
+        # /lugares?desde= obtido antes de um reinício seja sempre anterior à base
+        self.lugares = ArmazemLugares(
+            capacidade,
+            n_fatias=FATIAS_LOCK,
+            partilhado=partilhado,
+            versao_inicial=time.time_ns() // 1000,
+            n_processos=PROCESSOS_TCP if partilhado else 1,
+        )
+        # Contagens de transições por lugar, para a previsão (/previsao)
+        self.transicoes = EstimadorTransicoes(capacidade, partilhado=partilhado)
+        if partilhado:
+            atexit.register(self.lugares.fechar)
+            atexit.register(self.transicoes.fechar)
+
+        # Diário de eventos (opcional): repõe o estado anterior antes de aceitar ligações
+        self.diario = diario
+        if diario is not None:
+            self.restaurar()
+            diario.iniciar()
+            atexit.register(diario.fechar)
+
+        # Mapeia cada cliente (addr) para os IDs de lugares que lhe pertencem (array "I")
         self.clientes = {}
 
-        #FASE 4: chaves e certificado
-        self.certificado: str | None = None
+        # Snapshot imutável lido pelos handlers REST (ver publicar_snapshots);
+        # a condição acorda os clientes de /stream quando há um novo e protege
+        # as versões por lugar (versão do snapshot em que cada um mudou)
+        self._novo_snapshot = threading.Condition()
+        self.snapshot = None
+        self.publicar_snapshot()
+        self._versao_base = self.snapshot.versao
+        self._versoes_lugares = np.full(capacidade + 1, self._versao_base, dtype=np.int64)
+
+        # Série temporal da ocupação (ver amostrar_historico)
+        self.historico = HistoricoOcupacao(HISTORICO_NIVEIS)
 
-        log(f"[SEGURANÇA] A gerar par de chaves RSA 2048 para '{self.nome}'...")
-        self.private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048,
+        #FASE 4: chaves e certificado
+        # Com `chaves`, reutiliza a chave e o certificado do arranque anterior:
+        # /secure/* fica disponível sem gerar chaves nem esperar pelo Gestor
+        self.algoritmo = ALGORITMO_ASSINATURA
+        self.chaves = chaves
+        chave, certificado = chaves.carregar(self.algoritmo) if chaves else (None, None)
+        if chave is None:
+            log(f"[SEGURANÇA] A gerar par de chaves {self.algoritmo} para '{self.nome}'...")
+            chave = gerar_chave(self.algoritmo)
+            if chaves is not None:
+                chaves.guardar_chave(chave)
+            self._chave_criada = time.time()
+        else:
+            log(
+                f"[SEGURANÇA] Chave {self.algoritmo} reutilizada de '{chaves.diretoria}' "
+                f"({'com' if certificado else 'sem'} certificado válido)"
+            )
+            self._chave_criada = time.time() - chaves.idade_chave()
+        # Chave e certificado num só tuplo imutável (ver Credenciais)
+        self.credenciais = Credenciais(1, chave, certificado)
+        # As assinaturas que faltam na cache são feitas por um nº limitado de threads
+        self.servico_assinatura = ServicoAssinatura(
+            ASSINATURA_TRABALHADORES, ASSINATURA_FILA_MAX, ASSINATURA_ESPERA_MAX
         )
-        self.public_key = self.private_key.public_key()
+        self.assinaturas = CacheAssinaturas(CACHE_ASSINATURAS_MAX)
+        # Modo Merkle: as mensagens de /secure/* são assinadas em lote (raiz
+        # assinada com assinar_mensagem, um lote por geração da chave) e
+        # guardadas com a prova de inclusão
+        if ASSINATURA_MERKLE:
+            self.lotes = AssinadorLotes(self.assinar_mensagem, JANELA_LOTE_ASSINATURA)
+            self.provas = CacheAssinaturas(CACHE_ASSINATURAS_MAX)
+        else:
+            self.lotes = None
+            self.provas = None
+        # (geração da chave, cêntimos -> assinatura de {"valor": ...}) (ver
+        # assinar_envelope), preenchida por assinar_tarifas
+        self.tarifas_assinadas: tuple[int, dict[int, dict]] = (1, {})
+
+    @property
+    def private_key(self):
+        return self.credenciais.chave
+
+    @property
+    def public_key(self):
+        return self.credenciais.chave.public_key()
+
+    @property
+    def certificado(self) -> str | None:
+        return self.credenciais.certificado
 
     # Segurança: assinatura de mensagens
-    def assinar_mensagem(self, dados):
+    def assinar_mensagem(self, dados, credenciais: Credenciais | None = None):
         """
         Gera assinatura conforme regras do enunciado Fase 4:
           - Serializar JSON em utf-8 (quando for dicionário)
-          - Usar RSA + PSS + SHA256
+          - Usar RSA + PSS + SHA256 (ou o ALGORITMO_ASSINATURA configurado)
           - Devolver assinatura descodificada em 'cp437'
+        Assina com a chave de `credenciais` (por omissão, as atuais). Só assina
+        mensagens que ainda não estão em self.assinaturas, e fá-lo no serviço
+        de assinatura (pode lançar ServicoSobrecarregado).
         """
         if isinstance(dados, dict):
             msg_bytes = json.dumps(dados).encode("utf-8")
         else:
             msg_bytes = str(dados).encode("utf-8")
 
-        assinatura = self.private_key.sign(
-            msg_bytes,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH,
-            ),
-            hashes.SHA256(),
+        credenciais = credenciais or self.credenciais
+        return self.assinaturas.obter(
+            (credenciais.geracao, msg_bytes),
+            lambda: self._assinar_no_servico(msg_bytes, credenciais),
+        )
+
+    def _assinar_no_servico(self, msg_bytes: bytes, credenciais: Credenciais) -> str:
+        return self.servico_assinatura.assinar(
+            (credenciais.geracao, msg_bytes),
+            lambda: self._assinar_bytes(msg_bytes, credenciais.chave),
         )
+
+    def assinar_envelope(self, mensagem: dict, credenciais: Credenciais) -> dict:
+        """
+        Envelope seguro assinado com a chave de `credenciais` e com o
+        certificado dessas mesmas credenciais: {"algoritmo", "assinatura",
+        "certificado", "mensagem"} e, no modo Merkle, também {"merkle":
+        {"raiz": ..., "prova": [...]}}, em que a assinatura é a da raiz
+        (ver merkle.AssinadorLotes).
+        """
+        return {
+            **self._campos_assinatura(mensagem, credenciais),
+            "certificado": credenciais.certificado,
+            "mensagem": mensagem,
+        }
+
+    def _campos_assinatura(self, mensagem: dict, credenciais: Credenciais) -> dict:
+        if self.lotes is None:
+            assinatura = self.assinar_mensagem(mensagem, credenciais)
+            return {"algoritmo": self.algoritmo, "assinatura": assinatura}
+        msg_bytes = json.dumps(mensagem).encode("utf-8")
+        assinado = self.provas.obter(
+            (credenciais.geracao, msg_bytes),
+            lambda: self.lotes.assinar(msg_bytes, credenciais.geracao, credenciais),
+        )
+        return {"algoritmo": self.algoritmo, **assinado}
+
+    def _assinar_bytes(self, msg_bytes: bytes, chave) -> str:
+        assinatura = assinar(chave, self.algoritmo, msg_bytes)
         # Enunciado: a assinatura deve ser descodificada com cp437
         return assinatura.decode("cp437")
 
+    def definir_certificado(self, certificado: str) -> None:
+        """
+        Certificado recebido do Gestor para a chave atual (guardado em disco, se
+        mudou). A chave não muda, por isso a geração e as assinaturas mantêm-se.
+        """
+        atuais = self.credenciais
+        if certificado != atuais.certificado and self.chaves is not None:
+            self.chaves.guardar_certificado(certificado)
+        self.credenciais = atuais._replace(certificado=certificado)
+
+    def chave_expirada(self) -> bool:
+        return time.time() - self._chave_criada >= CHAVE_VALIDADE_DIAS * 86400
+
+    def instalar_chaves(self, chave, certificado: str) -> None:
+        """
+        Passa a assinar com `chave` (já certificada pelo Gestor): chave e
+        certificado mudam juntos, numa nova geração. Os pedidos em curso
+        terminam com as credenciais que leram; as entradas das caches da
+        geração anterior deixam de ser usadas (e são libertadas), e a tabela
+        de custos recomeça vazia (ver assinar_tarifas).
+        """
+        if self.chaves is not None:
+            self.chaves.guardar_chave(chave)
+            self.chaves.guardar_certificado(certificado)
+        geracao = self.credenciais.geracao + 1
+        self.tarifas_assinadas = (geracao, {})
+        self.credenciais = Credenciais(geracao, chave, certificado)
+        self._chave_criada = time.time()
+        self.assinaturas.limpar()
+        if self.provas is not None:
+            self.provas.limpar()
+
+    def mensagem_custo(self, centimos: int) -> dict:
+        return {"valor": round(centimos / 100, 2)}
+
+    def calcular_custo(self, minutos: float) -> int:
+        """Custo de uma estadia de `minutos`, em cêntimos (limitado pela tarifa máxima)."""
+        custo = self.tarifa_base + (minutos / 60) * self.tarifa_hora
+        custo = min(custo, self.tarifa_max)
+        return round(custo * 100)
+
+    def calcular_custos(self, minutos: np.ndarray) -> np.ndarray:
+        """
+        calcular_custo para um vetor de durações, de uma vez (int64, cêntimos).
+        As mesmas operações por elemento e o mesmo arredondamento (meio para
+        par), por isso cada valor é igual ao de /custo para essa duração.
+        """
+        custos = self.tarifa_base + (minutos / 60) * self.tarifa_hora
+        custos = np.minimum(custos, self.tarifa_max)
+        return np.rint(custos * 100).astype(np.int64)
+
+    def assinar_custo(self, centimos: int, credenciais: Credenciais) -> dict:
+        """
+        Envelope de {"valor": ...}: com a assinatura da tabela pré-calculada, se
+        for da mesma geração de `credenciais`, ou, se ainda lá não está, do LRU.
+        """
+        geracao, tabela = self.tarifas_assinadas
+        assinado = tabela.get(centimos) if geracao == credenciais.geracao else None
+        mensagem = self.mensagem_custo(centimos)
+        if assinado is None:
+            return self.assinar_envelope(mensagem, credenciais)
+        return {**assinado, "certificado": credenciais.certificado, "mensagem": mensagem}
+
+    def precomputar_tarifas(self) -> int:
+        """
+        Assina todos os valores possíveis de /secure/custo (da tarifa base à
+        tarifa máxima, ao cêntimo). A tabela vai sendo preenchida enquanto
+        corre, por isso os valores já assinados servem logo os pedidos.
+        As assinaturas são feitas no serviço de assinatura, em tarefas de
+        TARIFAS_POR_TAREFA valores e só quando não há pedidos à espera: não
+        ocupam mais do que ASSINATURA_TRABALHADORES cores nem atrasam uma
+        rajada de pedidos seguros (ex: depois de um arranque ou de uma rotação).
+        No modo Merkle, a tabela inteira é uma só árvore e uma só assinatura.
+        Devolve o nº de valores assinados (0 se forem mais do que TARIFAS_PRECOMPUTADAS_MAX).
+        """
+        # A tabela é desta geração da chave: se a chave rodar entretanto, as
+        # assinaturas continuam a ser da anterior, mas assinar_custo deixa de
+        # usar a tabela (ver instalar_chaves)
+        credenciais = self.credenciais
+        chave, tabela = credenciais.chave, {}
+        self.tarifas_assinadas = (credenciais.geracao, tabela)
+        servico = self.servico_assinatura
+        minimo = self.calcular_custo(0)
+        maximo = round(self.tarifa_max * 100)
+        if maximo - minimo + 1 > TARIFAS_PRECOMPUTADAS_MAX:
+            return 0
+        valores = range(minimo, maximo + 1)
+        mensagens = [json.dumps(self.mensagem_custo(c)).encode("utf-8") for c in valores]
+
+        if self.lotes is not None:
+            raiz, provas = construir(mensagens)
+            assinatura = servico.executar_em_segundo_plano(
+                lambda: self._assinar_bytes(raiz.encode("utf-8"), chave)
+            )
+            for centimos, prova in zip(valores, provas):
+                tabela[centimos] = {
+                    "algoritmo": self.algoritmo,
+                    "assinatura": assinatura,
+                    "merkle": {"raiz": raiz, "prova": prova},
+                }
+        else:
+            for inicio in range(0, len(valores), TARIFAS_POR_TAREFA):
+                parte = mensagens[inicio : inicio + TARIFAS_POR_TAREFA]
+                assinaturas = servico.executar_em_segundo_plano(
+                    lambda parte=parte: [self._assinar_bytes(m, chave) for m in parte]
+                )
+                for centimos, assinatura in zip(valores[inicio:], assinaturas):
+                    tabela[centimos] = {"algoritmo": self.algoritmo, "assinatura": assinatura}
+        return len(tabela)
+
     #Lógica normal do parque
-    def registar_lugar(self) -> int:
-        """Atribui um novo ID e marca o lugar como livre."""
+    def _definir_estado(self, lugar_id: int, estado: str) -> str | None:
+        """
+        Altera o estado de um lugar e regista-o no diário (chamar com o lock da
+        fatia). Devolve o estado anterior.
+        """
+        anterior = self.lugares.definir(lugar_id, estado)
+        if anterior != estado and self.diario is not None:
+            self.diario.registar_estado(lugar_id, estado)
+        return anterior
+
+    def _definir_estados(self, pares) -> list[str | None]:
+        """
+        Como _definir_estado para lugares da mesma fatia, com uma só escrita no
+        diário. Devolve os estados anteriores, pela mesma ordem.
+        """
+        pares = list(pares)
+        anteriores = [self.lugares.definir(lugar_id, estado) for lugar_id, estado in pares]
+        if self.diario is not None:
+            alterados = [
+                par for par, anterior in zip(pares, anteriores) if anterior != par[1]
+            ]
+            if alterados:
+                self.diario.registar_estados(alterados)
+        return anteriores
+
+    def restaurar(self) -> None:
+        """Repõe mapa_nomes e o estado dos lugares a partir do diário."""
+        inicio = time.perf_counter()
+        nomes, estados = self.diario.reproduzir(self.capacidade)
+
+        # Um nome registado sem eventos de estado (falha entre as duas escritas) fica livre
+        vetor = bytearray(estados)
+        for lid in nomes.values():
+            if vetor[lid] == NAO_REGISTADO:
+                vetor[lid] = LIVRE
+
+        with self.lock, self.lugares.todos_locks():
+            self.lugares.carregar(vetor)
+            self.mapa_nomes.update(nomes)
+
+        log(
+            f"[DIÁRIO] {len(nomes)} lugares e {self.lugares.ocupados()} ocupados "
+            f"repostos em {(time.perf_counter() - inicio) * 1000:.1f} ms"
+        )
+
+    def criar_instantaneo(self) -> int:
+        """
+        Grava o estado completo e compacta o diário. Os locks só são mantidos
+        para mudar de segmento e copiar o vetor de estados; os nomes e a escrita
+        em disco tratam-se depois, sem bloquear os sensores. Devolve o tamanho.
+        """
+        with self.lock, self.lugares.todos_locks():
+            segmento, anteriores = self.diario.rodar()
+            estados = self.lugares.copia_estados()
+        self.diario.fechar_fds(anteriores)
+
+        # Os IDs são sequenciais: os nomes registados depois da cópia têm IDs
+        # maiores e já estão no novo segmento
+        registados = len(estados) - estados.count(NAO_REGISTADO)
+        nomes = {
+            nome: lid for nome, lid in self.mapa_nomes.copy().items() if lid <= registados
+        }
+        return self.diario.gravar_instantaneo(segmento, estados, nomes)
+
+    def _verificar_contadores(self) -> None:
+        """Modo de depuração: compara o contador com uma recontagem completa."""
+        with self.lugares.todos_locks():
+            recontagem = self.lugares.contar("OCUPADO")
+            ocupados = self.lugares.ocupados()
+        if recontagem != ocupados:
+            log(f"[DEBUG] Contador inconsistente: {ocupados} != {recontagem}", "ERRO")
+            raise AssertionError(
+                f"Contador de ocupados inconsistente ({ocupados} != {recontagem})"
+            )
+
+    def _por_fatia(self, itens, id_de=lambda item: item) -> dict[int, list]:
+        """Agrupa itens pela fatia de lock do respetivo ID (IDs inválidos vão para a 0)."""
+        grupos = {}
+        for item in itens:
+            lid = id_de(item)
+            fatia = self.lugares.fatia(lid) if type(lid) is int else 0
+            grupos.setdefault(fatia, []).append(item)
+        return grupos
+
+    @property
+    def id_atual(self) -> int:
+        """Próximo ID a atribuir (os IDs são sequenciais e nunca são libertados)."""
+        return len(self.lugares) + 1
+
+    @property
+    def conexoes_ativas(self) -> int:
+        return self.lugares.ligacoes
+
+    @property
+    def atraso_loop_ms(self) -> float:
+        """Atraso do event loop (só é medido no modo asyncio), o pior entre processos TCP."""
+        return self.lugares.atraso_loop_ms
+
+    @_altera_estado
+    def registar_lugar(self, nome_lugar: str) -> tuple[int, bool]:
+        """
+        Regista um lugar pelo nome e devolve (id, novo). Se o nome já é
+        conhecido é uma reconexão: reutiliza o mesmo ID e marca o lugar como livre.
+        """
         with self.lock:
-            if len(self.lugares) >= self.capacidade:
-                raise ValueError("Capacidade máxima atingida")
-            lugar_id = self.id_atual
-            self.lugares[lugar_id] = "LIVRE"
-            self.id_atual += 1
-            return lugar_id
+            lugar_id = self.mapa_nomes.get(nome_lugar)
+            if lugar_id is None:
+                if len(self.lugares) >= self.capacidade:
+                    raise ValueError("Capacidade máxima atingida")
+                # Atribuir o ID e marcar o lugar ainda com o lock do registo
+                lugar_id = self.id_atual
+                if self.diario is not None:
+                    self.diario.registar_nome(lugar_id, nome_lugar)
+                with self.lugares.lock_de(lugar_id):
+                    self._definir_estado(lugar_id, "LIVRE")
+                self.mapa_nomes[nome_lugar] = lugar_id
+                return lugar_id, True
+
+        with self.lugares.lock_de(lugar_id):
+            self._definir_estado(lugar_id, "LIVRE")
+        return lugar_id, False
+
+    @_altera_estado
+    def libertar_lugares(self, ids) -> None:
+        """Marca como livres os lugares de um cliente que se desligou."""
+        for fatia, grupo in self._por_fatia(ids).items():
+            with self.lugares.lock_fatia(fatia):
+                self._definir_estados(
+                    (lid, "LIVRE") for lid in grupo if lid in self.lugares
+                )
 
+    @_altera_estado
     def atualizar_estado(self, lugar_id: int, estado: str) -> None:
         """Atualiza o estado (livre/ocupado) de um lugar."""
-        with self.lock:
-            if lugar_id not in self.lugares:
-                raise KeyError("ID inválido")
-            if estado not in ("LIVRE", "OCUPADO"):
-                raise ValueError("Estado inválido")
-            self.lugares[lugar_id] = estado
+        if lugar_id not in self.lugares:
+            raise KeyError("ID inválido")
+        if estado not in ("LIVRE", "OCUPADO"):
+            raise ValueError("Estado inválido")
+        with self.lugares.lock_de(lugar_id):
+            anterior = self._definir_estado(lugar_id, estado)
+            self.transicoes.observar(lugar_id, anterior, estado)
+
+    @_altera_estado
+    def atualizar_estados(self, itens: list[tuple[int, str]]) -> list[str]:
+        """
+        Atualiza vários lugares de uma só vez (comando MUPDATE), com uma única
+        aquisição de lock por fatia. Devolve um resultado por item, pela mesma
+        ordem: "OK", "ID_INVALIDO" ou "ESTADO_INVALIDO".
+        """
+        resultados = [None] * len(itens)
+        grupos = self._por_fatia(enumerate(itens), id_de=lambda par: par[1][0])
+        for fatia, grupo in grupos.items():
+            validos = []
+            for i, (lugar_id, estado) in grupo:
+                if lugar_id not in self.lugares:
+                    resultados[i] = "ID_INVALIDO"
+                elif estado not in ("LIVRE", "OCUPADO"):
+                    resultados[i] = "ESTADO_INVALIDO"
+                else:
+                    validos.append((lugar_id, estado))
+                    resultados[i] = "OK"
+            with self.lugares.lock_fatia(fatia):
+                anteriores = self._definir_estados(validos)
+                for (lugar_id, estado), anterior in zip(validos, anteriores):
+                    self.transicoes.observar(lugar_id, anterior, estado)
+        return resultados
+
+    @property
+    def ocupados(self) -> int:
+        """Lugares ocupados: soma dos contadores das fatias, sem adquirir locks."""
+        return self.lugares.ocupados()
+
+    def publicar_snapshot(self) -> Snapshot:
+        """
+        Publica um novo snapshot. Não adquire locks: a versão é lida antes da
+        cópia dos estados e as contagens saem dessa mesma cópia.
+        """
+        versao = self.lugares.versao
+        estados = self.lugares.copia_estados()
+        ocupados = estados.count(OCUPADO)
+
+        snapshot = Snapshot(
+            versao=versao,
+            instante=time.time(),
+            nome=self.nome,
+            localizacao=self.localizacao,
+            tarifa_base=self.tarifa_base,
+            tarifa_hora=self.tarifa_hora,
+            tarifa_max=self.tarifa_max,
+            capacidade=self.capacidade,
+            ocupados=ocupados,
+            livres=self.capacidade - ocupados,
+            estados=estados,
+        )
+        with self._novo_snapshot:
+            anterior, self.snapshot = self.snapshot, snapshot
+            if anterior is not None:
+                mudaram = np.flatnonzero(
+                    np.frombuffer(snapshot.estados, dtype=np.uint8)
+                    != np.frombuffer(anterior.estados, dtype=np.uint8)
+                )
+                self._versoes_lugares[mudaram] = snapshot.versao
+            self._novo_snapshot.notify_all()
+        return snapshot
+
+    def alteracoes_desde(self, desde: int, espera: float = 0) -> tuple[Snapshot, list | None]:
+        """
+        Snapshot atual e pares (id, estado) dos lugares que mudaram depois da
+        versão `desde`, ou None se o cursor não for utilizável (anterior ao
+        arranque ou de outra execução): o cliente tem de ressincronizar tudo.
+        Sem alterações, espera até `espera` segundos por uma (long-polling).
+        """
+        with self._novo_snapshot:
+            if desde < self._versao_base or desde > self.snapshot.versao:
+                return self.snapshot, None
+            if espera > 0:
+                self._novo_snapshot.wait_for(lambda: self.snapshot.versao > desde, espera)
+
+            snap = self.snapshot
+            ids = np.flatnonzero(self._versoes_lugares > desde)
+        codigos = np.frombuffer(snap.estados, dtype=np.uint8)[ids]
+        return snap, [
+            (int(lid), ESTADOS[codigo]) for lid, codigo in zip(ids, codigos) if codigo
+        ]
+
+    def esperar_snapshot(self, versao: int, timeout: float) -> Snapshot:
+        """Espera (no máximo `timeout` s) por um snapshot com versão diferente de `versao`."""
+        with self._novo_snapshot:
+            self._novo_snapshot.wait_for(lambda: self.snapshot.versao != versao, timeout)
+        return self.snapshot
+
+    def prever(self, minutos: float) -> dict:
+        """
+        Ocupação prevista daqui a `minutos`, a partir do snapshot atual e das
+        taxas de transição estimadas para cada lugar (um passo por INTERVALO_SIMULACAO).
+        """
+        passos = math.ceil(minutos * 60 / INTERVALO_SIMULACAO)
+        snap = self.snapshot
+        po, pl = self.transicoes.taxas(PO, PL, PREVISAO_PESO_PRIOR)
+        projecao = projetar(snap.estados, po, pl, passos)
+        return {
+            "minutos": minutos,
+            "passos": passos,
+            "capacidade": snap.capacidade,
+            "ocupados_atual": snap.ocupados,
+            "ocupados_previstos": round(projecao["media"], 2),
+            "desvio_padrao": round(projecao["desvio"], 2),
+            "intervalo_90": [round(projecao["minimo"], 2), round(projecao["maximo"], 2)],
+            "po_estimado": round(projecao["po_medio"], 4),
+            "pl_estimado": round(projecao["pl_medio"], 4),
+            "observacoes": self.transicoes.observacoes(),
+        }
 
     def contar_ocupados(self) -> int:
-        """Conta quantos lugares estão ocupados."""
-        return list(self.lugares.values()).count("OCUPADO")
+        """Número de lugares ocupados (contadores mantidos a cada transição, O(1))."""
+        return self.ocupados
+
+    def contar_livres(self) -> int:
+        """Número de lugares livres (inclui os que ainda não foram registados)."""
+        return self.capacidade - self.ocupados
 
     def info(self) -> str:
         """Retorna um resumo textual das informações do parque."""
-        livres = self.capacidade - self.contar_ocupados()
+        livres = self.contar_livres()
         return (
             f"Nome: {self.nome}\n"
             f"Localização (WGS84): {self.localizacao[0]}, {self.localizacao[1]}\n"
@@ -125,138 +685,344 @@ class Parque:
 
 #  Funções auxiliares
 
-def log(msg: str) -> None:
-    """Imprime mensagens formatadas com hora (se log ativo)."""
+registo = RegistoAssincrono(
+    nivel=LOG_NIVEL,
+    ficheiro=LOG_FICHEIRO,
+    max_bytes=LOG_MAX_BYTES,
+    n_backups=LOG_BACKUPS,
+    tamanho_fila=LOG_FILA_MAX,
+    amostragem=LOG_AMOSTRAGEM,
+)
+
+
+def log(msg: str, nivel: str = "INFO") -> None:
+    """Regista mensagens formatadas com hora (se log ativo), sem bloquear quem chama."""
     if LOG_VERBOSO:
-        hora = time.strftime("%H:%M:%S")
-        print(f"[{hora}] {msg}")
+        registo.registar(msg, nivel)
+
+
+def log_mensagem(msg: str) -> None:
+    """Registo por mensagem dos sensores: amostrado (1 em cada LOG_AMOSTRAGEM)."""
+    if LOG_VERBOSO:
+        registo.registar_amostrado(msg)
 
 
 #  Servidor TCP (Lugares)
 
-def handle_client(conn, addr, parque: Parque):
-    """Trata da comunicação com um cliente (Lugar) e mantém IDs persistentes."""
+def processar_mensagem(mensagem: str, addr, parque: Parque) -> str:
+    """Interpreta uma mensagem de um Lugar e devolve a resposta codificada."""
+    log_mensagem(f"[RECEBIDO de {addr}] {mensagem}")
+
+    try:
+        dados = descodificar(mensagem)
+        comando = dados["comando"]
+
+        # Comando INIT (registar ou reconectar Lugar)
+        if comando == "INIT":
+            nome_lugar = dados.get("nome")
+
+            if not nome_lugar:
+                raise ParametrosInvalidos("Nome do lugar em falta")
+
+            # Negociação do formato: se o pedido for desconhecido, fica o texto
+            formato = dados.get("formato")
+            extra = {}
+            if formato is not None:
+                extra["formato"] = formato if formato in FORMATOS_SUPORTADOS else FORMATO_TEXTO
+
+            # Se já existe esse nome, é reconexão: reutiliza o mesmo ID.
+            # Novo lugar — só se ainda houver capacidade global (senão ValueError)
+            lugar_id, novo = parque.registar_lugar(nome_lugar)
+
+            if addr not in parque.clientes:
+                parque.clientes[addr] = novo_registo_cliente()
+            if lugar_id not in parque.clientes[addr]:
+                parque.clientes[addr].append(lugar_id)
+
+            resposta = codificar("OK", id=lugar_id, **extra)
+            if novo:
+                log(f"[REGISTADO] {nome_lugar} criado com ID {lugar_id}.")
+            else:
+                log(f"[RECONEXÃO] {nome_lugar} retomou com ID {lugar_id}.")
+
+        # Comando UPDATE (atualizar estado do lugar)
+        elif comando == "UPDATE":
+            if "id" not in dados or "estado" not in dados:
+                raise ParametrosInvalidos("Faltam parâmetros obrigatórios")
+
+            id_int = int(dados["id"])
+            estado = dados["estado"].upper()
+            parque.atualizar_estado(id_int, estado)
+            ocupados = parque.contar_ocupados()
+
+            resposta = codificar(
+                "OK",
+                msg=f"estado atualizado ({ocupados}/{parque.capacidade})",
+            )
+
+            log_mensagem(
+                f"[ATUALIZADO] Lugar {id_int} -> {estado} "
+                f"({ocupados}/{parque.capacidade} ocupados)"
+            )
+
+        # Comando MUPDATE (vários lugares numa só mensagem, ex: gateway de um piso)
+        elif comando == "MUPDATE":
+            if "itens" not in dados:
+                raise ParametrosInvalidos("Faltam parâmetros obrigatórios")
+            _validar_lote(len(dados["itens"]))
+            # A resposta repete cada id com o seu resultado: um lote de ids
+            # longos ou inválidos podia dar uma resposta maior do que o
+            # enquadramento permite (e fechar a ligação). Recusa-o antes de aplicar
+            tamanho = sum(len(lid.encode()) + _TAMANHO_RESULTADO for lid, _ in dados["itens"])
+            if tamanho > TAMANHO_MAX_MENSAGEM - _MARGEM_RESPOSTA:
+                raise ParametrosInvalidos("Lote demasiado grande para a resposta")
+
+            # IDs não numéricos nunca existem: ficam com resultado ID_INVALIDO
+            itens = [
+                (int(lid) if lid.isdigit() else -1, estado.upper())
+                for lid, estado in dados["itens"]
+            ]
+            resultados = parque.atualizar_estados(itens)
+            ocupados = parque.contar_ocupados()
+            aplicados = resultados.count("OK")
+
+            resposta = codificar(
+                "OK",
+                resultados=[(lid, r) for (lid, _), r in zip(dados["itens"], resultados)],
+                msg=f"{aplicados}/{len(itens)} atualizados ({ocupados}/{parque.capacidade})",
+            )
+
+            log_mensagem(
+                f"[ATUALIZADO] Lote de {len(itens)} lugares ({aplicados} aplicados, "
+                f"{ocupados}/{parque.capacidade} ocupados)"
+            )
+
+        # Comando INFO (resumo do parque)
+        elif comando == "INFO":
+            resposta = codificar("OK", info=parque.info())
+
+        # Comando inválido
+        else:
+            raise ComandoInvalido(f"Comando inválido: {comando}")
+
+    except (
+        ValueError,
+        KeyError,
+        ParametrosInvalidos,
+        ComandoInvalido,
+        ProtocoloErro,
+    ) as e:
+        resposta = codificar("ERRO", msg=str(e))
+
+    return resposta
+
+
+# Pior caso, por item, do par "id:resultado" na resposta de texto a um MUPDATE
+_TAMANHO_RESULTADO = len(",:") + max(len(r) for r in RESULTADOS_BINARIO)
+_MARGEM_RESPOSTA = 256  # "OK;;resultados=" e ";;msg=..." da mesma resposta
+
+
+def _validar_lote(n_itens: int) -> None:
+    if n_itens > MUPDATE_MAX_ITENS:
+        raise ParametrosInvalidos(f"Lote com mais de {MUPDATE_MAX_ITENS} itens")
+
+
+def processar_binario(mensagem: bytes, addr, parque: Parque) -> bytes:
+    """Interpreta uma mensagem no formato binário (UPDATE/MUPDATE) e devolve a resposta."""
+    try:
+        dados = descodificar_binario(mensagem)
+        log_mensagem(f"[RECEBIDO de {addr}] {dados}")
+        comando = dados["comando"]
+
+        if comando == "UPDATE":
+            parque.atualizar_estado(dados["id"], dados["estado"])
+            ocupados = parque.contar_ocupados()
+            resposta = codificar_ok_binario(ocupados, parque.capacidade)
+            log_mensagem(
+                f"[ATUALIZADO] Lugar {dados['id']} -> {dados['estado']} "
+                f"({ocupados}/{parque.capacidade} ocupados)"
+            )
+
+        elif comando == "MUPDATE":
+            # Aqui a resposta tem 1 byte por item (menos do que o pedido): só o limite de itens
+            _validar_lote(len(dados["itens"]))
+            resultados = parque.atualizar_estados(dados["itens"])
+            ocupados = parque.contar_ocupados()
+            resposta = codificar_ok_binario(ocupados, parque.capacidade, resultados)
+            log_mensagem(
+                f"[ATUALIZADO] Lote de {len(resultados)} lugares "
+                f"({resultados.count('OK')} aplicados, {ocupados}/{parque.capacidade} ocupados)"
+            )
+
+        else:
+            raise ComandoInvalido(f"Comando inválido: {comando}")
+
+    except KeyError:
+        resposta = codificar_erro_binario("ID_INVALIDO")
+    except ValueError:
+        resposta = codificar_erro_binario("ESTADO_INVALIDO")
+    except FormatoInvalido:
+        resposta = codificar_erro_binario("FORMATO_INVALIDO")
+    except ComandoInvalido:
+        resposta = codificar_erro_binario("COMANDO_INVALIDO")
+    except ParametrosInvalidos:
+        resposta = codificar_erro_binario("ERRO")
+
+    return resposta
+
+
+def ligacao_aberta(addr, parque: Parque) -> None:
+    """Regista uma nova ligação de um cliente (Lugar)."""
     log(f"[+] Ligação estabelecida com {addr}")
 
+    parque.lugares.ajustar_ligacoes(1)
+
     # Garante que o cliente existe no registo (pode não ter nomes ainda)
     if addr not in parque.clientes:
-        parque.clientes[addr] = []
+        parque.clientes[addr] = novo_registo_cliente()
+
+
+def ligacao_terminada(addr, parque: Parque) -> None:
+    """Liberta os lugares de um cliente que se desligou (mas não apaga o mapa_nomes)."""
+    log(f"[-] Ligação terminada: {addr}")
+    parque.lugares.ajustar_ligacoes(-1)
+    parque.libertar_lugares(parque.clientes.get(addr, []))
+
+
+def _processar_bloco(
+    descodificador: DescodificadorStream, dados: bytes, addr, parque: Parque
+) -> bytes:
+    """
+    Alimenta o descodificador com um bloco recebido e devolve as respostas
+    (já enquadradas e pela mesma ordem) a todas as mensagens completas.
+    """
+    descodificador.alimentar(dados)
+    respostas = [
+        enquadrar(
+            processar_binario(mensagem, addr, parque)
+            if e_binaria(mensagem)
+            else processar_mensagem(mensagem.decode().strip(), addr, parque)
+        )
+        for mensagem in descodificador
+    ]
+    return b"".join(respostas)
+
+
+def handle_client(conn, addr, parque: Parque):
+    """Trata da comunicação com um cliente (Lugar) e mantém IDs persistentes."""
+    ligacao_aberta(addr, parque)
+    descodificador = DescodificadorStream()
 
-    with conn:
+    try:
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(4096)
+                    if not data:
+                        break
+
+                    respostas = _processar_bloco(descodificador, data, addr, parque)
+
+                    # Enviar respostas ao cliente (pode haver várias em pipeline)
+                    if respostas:
+                        conn.sendall(respostas)
+
+                except FormatoInvalido as e:
+                    # Enquadramento corrompido: não é possível ressincronizar a stream
+                    conn.sendall(enquadrar(codificar("ERRO", msg=str(e))))
+                    break
+
+                except ConnectionResetError:
+                    break
+    finally:
+        ligacao_terminada(addr, parque)
+
+
+async def handle_client_async(reader, writer, parque: Parque):
+    """Versão em corrotina de handle_client, para o modo asyncio."""
+    addr = writer.get_extra_info("peername")
+    ligacao_aberta(addr, parque)
+    descodificador = DescodificadorStream()
+
+    try:
         while True:
             try:
-                data = conn.recv(1024)
+                data = await reader.read(4096)
                 if not data:
                     break
 
-                mensagem = data.decode().strip()
-                log(f"[RECEBIDO de {addr}] {mensagem}")
+                respostas = _processar_bloco(descodificador, data, addr, parque)
 
-                try:
-                    dados = descodificar(mensagem)
-                    comando = dados["comando"]
-                    
-                    # Comando INIT (registar ou reconectar Lugar)
-                    if comando == "INIT":
-                        nome_lugar = dados.get("nome")
-
-                        if not nome_lugar:
-                            raise ParametrosInvalidos("Nome do lugar em falta")
-
-                        # Se já existe esse nome, é reconexão: reutiliza o mesmo ID
-                        if nome_lugar in parque.mapa_nomes:
-                            lugar_id = parque.mapa_nomes[nome_lugar]
-                            parque.lugares[lugar_id] = "LIVRE"
-
-                            if addr not in parque.clientes:
-                                parque.clientes[addr] = []
-                            if lugar_id not in parque.clientes[addr]:
-                                parque.clientes[addr].append(lugar_id)
-
-                            resposta = codificar("OK", id=lugar_id)
-                            log(f"[RECONEXÃO] {nome_lugar} retomou com ID {lugar_id}.")
-                        else:
-                            # Novo lugar — só se ainda houver capacidade global
-                            if len(parque.lugares) >= parque.capacidade:
-                                resposta = codificar("ERRO", msg="Capacidade máxima atingida")
-                            else:
-                                lugar_id = parque.registar_lugar()
-                                parque.mapa_nomes[nome_lugar] = lugar_id
-                                if addr not in parque.clientes:
-                                    parque.clientes[addr] = []
-                                parque.clientes[addr].append(lugar_id)
-                                resposta = codificar("OK", id=lugar_id)
-                                log(f"[REGISTADO] {nome_lugar} criado com ID {lugar_id}.")
-
-                    
-                    # Comando UPDATE (atualizar estado do lugar)
-                    elif comando == "UPDATE":
-                        if "id" not in dados or "estado" not in dados:
-                            raise ParametrosInvalidos("Faltam parâmetros obrigatórios")
-
-                        id_int = int(dados["id"])
-                        estado = dados["estado"].upper()
-                        parque.atualizar_estado(id_int, estado)
-                        ocupados = parque.contar_ocupados()
-
-                        resposta = codificar(
-                            "OK",
-                            msg=f"estado atualizado ({ocupados}/{parque.capacidade})",
-                        )
-
-                        log(
-                            f"[ATUALIZADO] Lugar {id_int} -> {estado} "
-                            f"({ocupados}/{parque.capacidade} ocupados)"
-                        )
-
-                    # Comando INFO (resumo do parque)
-                    elif comando == "INFO":
-                        resposta = codificar("OK", info=parque.info())
-
-                    # Comando inválido
-                    else:
-                        raise ComandoInvalido(f"Comando inválido: {comando}")
-
-                except (
-                    ValueError,
-                    KeyError,
-                    ParametrosInvalidos,
-                    ComandoInvalido,
-                    ProtocoloErro,
-                ) as e:
-                    resposta = codificar("ERRO", msg=str(e))
-
-                # Enviar resposta ao cliente
-                conn.sendall(resposta.encode())
+                # Enviar respostas ao cliente (pode haver várias em pipeline)
+                if respostas:
+                    writer.write(respostas)
+                    await writer.drain()
 
-            except ConnectionResetError:
+            except FormatoInvalido as e:
+                # Enquadramento corrompido: não é possível ressincronizar a stream
+                writer.write(enquadrar(codificar("ERRO", msg=str(e))))
+                await writer.drain()
                 break
 
-    # Quando o cliente se desconecta, liberta os seus lugares (mas não apaga o mapa_nomes)
-    log(f"[-] Ligação terminada: {addr}")
-    if addr in parque.clientes:
-        with parque.lock:
-            for lid in parque.clientes[addr]:
-                if lid in parque.lugares:
-                    parque.lugares[lid] = "LIVRE"
+            except ConnectionResetError:
+                break
+    finally:
+        writer.close()
+        ligacao_terminada(addr, parque)
 
 #  API REST (Flask)
 app = Flask(__name__)
 
+# Corpos já serializados de /info, /ocupacao, /lugares e /secure/info
+cache_respostas = CacheRespostas()
+
+
+def _etag(*partes) -> str:
+    """
+    ETag forte a partir dos valores de que o corpo depende. A versão base (do
+    arranque) entra sempre, porque nome, tarifas, etc. podem mudar entre execuções.
+    """
+    return "-".join(str(parte) for parte in (parque._versao_base, *partes))
+
+
+def _resposta_condicional(nome: str, etag: str, gerar_dados) -> Response:
+    """
+    GET condicional com cache: se o cliente já tem esta versão (If-None-Match)
+    responde 304; senão envia o corpo guardado em cache_respostas para este
+    ETag, só gerando e serializando os dados quando o ETag mudou.
+    JSON compacto por omissão, indentado com ?pretty=1 (outro ETag e outra entrada).
+    """
+    bonito = request.args.get("pretty") in ("1", "true")
+    if bonito:
+        etag += "-pretty"
+
+    cabecalhos = {"ETag": f'"{etag}"', "Cache-Control": CACHE_CONTROL}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=cabecalhos)
+
+    corpo = cache_respostas.obter(
+        (nome, bonito), etag, lambda: serializar(gerar_dados(), bonito)
+    )
+    return Response(corpo, mimetype="application/json", headers=cabecalhos)
+
+
 @app.route("/info", methods=["GET"])
 def info_rest():
-    livres = parque.capacidade - parque.contar_ocupados()
-    dados = {
-        "nome": parque.nome,
-        "lotacao": parque.capacidade,
-        "livre": livres,
-        "tarifa_base": parque.tarifa_base,
-        "tarifa_hora": parque.tarifa_hora,
-        "tarifa_max": parque.tarifa_max,
-        "latitude": parque.localizacao[0],
-        "longitude": parque.localizacao[1],
+    snap = parque.snapshot
+    return _resposta_condicional("info", _etag("info", snap.livres), lambda: _dados_info(snap))
+
+
+def _dados_info(snap: Snapshot) -> dict:
+    return {
+        "nome": snap.nome,
+        "lotacao": snap.capacidade,
+        "livre": snap.livres,
+        "tarifa_base": snap.tarifa_base,
+        "tarifa_hora": snap.tarifa_hora,
+        "tarifa_max": snap.tarifa_max,
+        "latitude": snap.localizacao[0],
+        "longitude": snap.localizacao[1],
     }
-    return Response(json.dumps(dados, indent=2), mimetype="application/json")
 
 
 @app.route("/custo", methods=["GET"])
@@ -268,10 +1034,7 @@ def custo_rest():
         if minutos < 0:
             raise ValueError
 
-        custo = parque.tarifa_base + (minutos / 60) * parque.tarifa_hora
-        custo = min(custo, parque.tarifa_max)
-
-        dados = {"valor": round(custo, 2)}
+        dados = parque.mensagem_custo(parque.calcular_custo(minutos))
         return Response(json.dumps(dados, indent=2), mimetype="application/json")
 
     except (TypeError, ValueError):
@@ -281,28 +1044,222 @@ def custo_rest():
         )
 
 
+def _duracoes_lote() -> np.ndarray:
+    """
+    Durações (minutos) de /custo/lote: lista em ?tempos=10,20,30 ou intervalo
+    em ?de=0&ate=600&passo=15 (com `ate` incluído). Lança ValueError se forem
+    inválidas ou mais do que CUSTO_LOTE_MAX.
+
+    O intervalo é contado em decimal e cada duração arredondada às casas
+    decimais de `de` e `passo`, para que ?de=0&ate=1&passo=0.1 devolva
+    0.3 (e não 0.30000000000000004), tal como se tivesse sido pedido em ?tempos=.
+    """
+    tempos = request.args.get("tempos")
+    if tempos is not None:
+        minutos = np.array([float(t) for t in tempos.split(",")], dtype=np.float64)
+    else:
+        de = _decimal(request.args.get("de", "0"))
+        ate = _decimal(request.args["ate"])
+        passo = _decimal(request.args.get("passo", "1"))
+        try:
+            if passo <= 0 or ate < de or (ate - de) / passo + 1 > CUSTO_LOTE_MAX:
+                raise ValueError
+            n = int((ate - de) // passo) + 1
+        except DecimalException:  # ex: ?ate=1e999999999 (Overflow), não um erro do servidor
+            raise ValueError("Intervalo fora dos limites")
+        casas = min(_CASAS_MAX, max(0, -de.as_tuple().exponent, -passo.as_tuple().exponent))
+        minutos = np.round(float(de) + float(passo) * np.arange(n), casas)
+
+    if not 0 < len(minutos) <= CUSTO_LOTE_MAX:
+        raise ValueError
+    if not np.all(np.isfinite(minutos)) or np.any(minutos < 0):
+        raise ValueError
+    return minutos
+
+
+_CASAS_MAX = 15  # casas decimais a partir das quais as durações já não são exatas em float
+
+
+def _decimal(valor: str) -> Decimal:
+    """Decimal finito a partir de um parâmetro; ValueError se não for um número."""
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        raise ValueError(f"Número inválido: {valor!r}")
+    if not numero.is_finite():
+        raise ValueError(f"Número inválido: {valor!r}")
+    return numero
+
+
+def _mensagem_lote(minutos: np.ndarray) -> dict:
+    return {
+        "tempos": minutos.tolist(),
+        "valores": (parque.calcular_custos(minutos) / 100).tolist(),
+    }
+
+
+@app.route("/custo/lote", methods=["GET"])
+def custo_lote_rest():
+    """Custos de várias durações num só pedido (ex: uma curva de preços)."""
+    try:
+        minutos = _duracoes_lote()
+    except (KeyError, TypeError, ValueError):
+        erro = {
+            "erro": f"Indique 'tempos' (lista separada por vírgulas) ou 'de', 'ate' e "
+            f"'passo' (no máximo {CUSTO_LOTE_MAX} durações, todas >= 0)"
+        }
+        return Response(
+            json.dumps(erro, indent=2), status=400, mimetype="application/json"
+        )
+    return Response(serializar(_mensagem_lote(minutos)), mimetype="application/json")
+
+
 @app.route("/ocupacao", methods=["GET"])
 def ocupacao_rest():
     """Devolve a taxa de ocupação e contagem de lugares."""
-    ocupados = parque.contar_ocupados()
-    livres = parque.capacidade - ocupados
-    percentagem = round((ocupados / parque.capacidade) * 100, 2)
+    snap = parque.snapshot
+
+    return _resposta_condicional(
+        "ocupacao",
+        _etag("ocupacao", snap.ocupados),
+        lambda: {
+            "ocupados": snap.ocupados,
+            "livres": snap.livres,
+            "capacidade": snap.capacidade,
+            "ocupacao_percent": snap.percentagem,
+        },
+    )
 
-    dados = {
-        "ocupados": ocupados,
-        "livres": livres,
-        "capacidade": parque.capacidade,
-        "ocupacao_percent": percentagem,
-    }
-    return Response(json.dumps(dados, indent=2), mimetype="application/json")
+
+@app.route("/historico", methods=["GET"])
+def historico_rest():
+    """
+    Ocupação ao longo do tempo: /historico?desde=&ate=&resolucao=
+    (instantes Unix em segundos; resolução "1s", "1min", "1h" ou segundos).
+    Por omissão, a última hora ao minuto.
+    """
+    agora = time.time()
+    try:
+        ate = float(request.args.get("ate", agora))
+        desde = float(request.args.get("desde", ate - 3600))
+        resolucao = resolucao_em_segundos(request.args.get("resolucao", "1min"))
+        dados = parque.historico.consultar(desde, ate, resolucao)
+        return Response(json.dumps(dados, indent=2), mimetype="application/json")
+
+    except (TypeError, ValueError):
+        erro = {"erro": "Parâmetros 'desde', 'ate' ou 'resolucao' inválidos"}
+        return Response(
+            json.dumps(erro, indent=2), status=400, mimetype="application/json"
+        )
+
+
+@app.route("/previsao", methods=["GET"])
+def previsao_rest():
+    """Previsão da ocupação daqui a N minutos: /previsao?minutos=N."""
+    try:
+        minutos = float(request.args.get("minutos"))
+        if not 0 <= minutos <= 7 * 24 * 60:
+            raise ValueError
+        dados = parque.prever(minutos)
+        return Response(json.dumps(dados, indent=2), mimetype="application/json")
+
+    except (TypeError, ValueError):
+        erro = {"erro": "Parâmetro 'minutos' inválido ou em falta"}
+        return Response(
+            json.dumps(erro, indent=2), status=400, mimetype="application/json"
+        )
 
 
 @app.route("/lugares", methods=["GET"])
 def lugares_rest():
-    """Lista todos os lugares com o respetivo estado."""
-    with parque.lock:
-        dados = [{"id": lid, "estado": estado} for lid, estado in parque.lugares.items()]
-    return Response(json.dumps(dados, indent=2), mimetype="application/json")
+    """
+    Lista todos os lugares com o respetivo estado (versão no cabeçalho X-Versao).
+
+    Sincronização incremental: /lugares?desde=<versao>[&espera=<s>] devolve só
+    os lugares alterados depois dessa versão, com a nova versão a usar como
+    cursor no pedido seguinte. Se o cursor for inválido (ex: reinício do
+    parque), "completo" vem a true e a lista tem todos os lugares.
+    Com `espera`, o pedido fica em espera até haver alterações (long-polling).
+    """
+    desde = request.args.get("desde")
+    if desde is None:
+        snap = parque.snapshot
+        resposta = _resposta_condicional(
+            "lugares",
+            _etag("lugares", snap.versao),
+            lambda: [{"id": lid, "estado": estado} for lid, estado in snap.items()],
+        )
+        resposta.headers["X-Versao"] = str(snap.versao)
+        return resposta
+
+    try:
+        desde = int(desde)
+        espera = min(float(request.args.get("espera", 0)), ESPERA_MAX_LUGARES)
+    except ValueError:
+        erro = {"erro": "Parâmetros 'desde' ou 'espera' inválidos"}
+        return Response(
+            json.dumps(erro, indent=2), status=400, mimetype="application/json"
+        )
+
+    snap, alterados = parque.alteracoes_desde(desde, espera)
+    completo = alterados is None
+    if completo:
+        alterados = list(snap.items())
+
+    dados = {
+        "versao": snap.versao,
+        "completo": completo,
+        "lugares": [{"id": lid, "estado": estado} for lid, estado in alterados],
+    }
+    return Response(
+        json.dumps(dados, separators=(",", ":")),
+        mimetype="application/json",
+        headers={"X-Versao": str(snap.versao)},
+    )
+
+
+def _evento_sse(tipo: str, snap: Snapshot, lugares) -> str:
+    """Um evento Server-Sent Events com as contagens e os lugares (pares [id, estado])."""
+    dados = {
+        "versao": snap.versao,
+        "ocupados": snap.ocupados,
+        "livres": snap.livres,
+        "capacidade": snap.capacidade,
+        "ocupacao_percent": snap.percentagem,
+        "lugares": lugares,
+    }
+    return f"id: {snap.versao}\nevent: {tipo}\ndata: {json.dumps(dados, separators=(',', ':'))}\n\n"
+
+
+@app.route("/stream", methods=["GET"])
+def stream_rest():
+    """
+    Alterações de ocupação em tempo real (Server-Sent Events): um evento
+    "completo" com todos os lugares e depois eventos "delta" só com os lugares
+    que mudaram. Cada cliente compara o snapshot que já enviou com o mais
+    recente, por isso vários UPDATE entre snapshots chegam num só evento e um
+    cliente lento nunca acumula eventos em atraso. Sem alterações, o cliente
+    fica parado à espera (com um comentário de keep-alive a cada INTERVALO_PING_SSE s).
+    """
+
+    def eventos():
+        snap = parque.snapshot
+        yield _evento_sse("completo", snap, list(snap.items()))
+        while True:
+            novo = parque.esperar_snapshot(snap.versao, INTERVALO_PING_SSE)
+            if novo.versao == snap.versao:
+                yield ": ping\n\n"
+                continue
+            alterados = novo.alteracoes(snap)
+            snap = novo
+            if alterados:
+                yield _evento_sse("delta", snap, alterados)
+
+    return Response(
+        eventos(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/health", methods=["GET"])
@@ -322,31 +1279,47 @@ def health():
         "Tempo Ativo": uptime,
         "Servidor TCP Ativo": tcp_ok,
         "Gestor Sincronizado": gestor_ok,
+        "Modo TCP": MODO_TCP,
+        "Processos TCP": PROCESSOS_TCP,
+        "Ligações Ativas": parque.conexoes_ativas,
+        "Atraso Event Loop (ms)": round(parque.atraso_loop_ms, 2),
+        "Versão do Estado": parque.snapshot.versao,
+        "Logs Descartados": registo.descartadas,
+        "Cache de Respostas": {
+            "acertos": cache_respostas.acertos,
+            "falhas": cache_respostas.falhas,
+        },
+        "Cache de Assinaturas": parque.assinaturas.estatisticas(),
+        "Serviço de Assinatura": parque.servico_assinatura.estatisticas(),
+        "Custos Pré-assinados": len(parque.tarifas_assinadas[1]),
+        "Lotes Merkle": parque.lotes.estatisticas() if parque.lotes else None,
     }
     return Response(json.dumps(dados, indent=2), mimetype="application/json")
 
 
 @app.route("/dashboard", methods=["GET"])
 def dashboard():
-    """Interface HTML simples com estado atual do parque."""
-    ocupados = parque.contar_ocupados()
-    livres = parque.capacidade - ocupados
-    percentagem = round((ocupados / parque.capacidade) * 100, 2)
+    """
+    Interface HTML simples com estado atual do parque. A página é gerada uma
+    vez e depois atualizada pelos eventos de /stream (sem recarregar).
+    """
+    snap = parque.snapshot
+    ocupados = snap.ocupados
+    percentagem = snap.percentagem
 
     # Gerar tabela HTML de lugares
     linhas = ""
-    with parque.lock:
-        for lid, estado in parque.lugares.items():
-            cor = "#dc3545" if estado == "OCUPADO" else "#28a745"
-            linhas += (
-                f"<tr><td>{lid}</td><td style='color:{cor};font-weight:bold'>{estado}</td></tr>"
-            )
+    for lid, estado in snap.items():
+        cor = "#dc3545" if estado == "OCUPADO" else "#28a745"
+        linhas += (
+            f"<tr id='lugar-{lid}'><td>{lid}</td>"
+            f"<td style='color:{cor};font-weight:bold'>{estado}</td></tr>"
+        )
 
     html = f"""
     <html>
     <head>
-        <title>{parque.nome} - Dashboard</title>
-        <meta http-equiv="refresh" content="10">
+        <title>{snap.nome} - Dashboard</title>
         <style>
             body {{ font-family: Arial; margin: 40px; background-color: #f7f7f7; }}
             h1 {{ color: #333; }}
@@ -358,19 +1331,49 @@ def dashboard():
     </head>
     <body>
         <div class="card">
-            <h1>🏙️ {parque.nome}</h1>
-            <p><b>Localização:</b> {parque.localizacao[0]}, {parque.localizacao[1]}</p>
-            <p><b>Tarifas:</b> Base {parque.tarifa_base}€, Hora {parque.tarifa_hora}€, Máx {parque.tarifa_max}€</p>
+            <h1>🏙️ {snap.nome}</h1>
+            <p><b>Localização:</b> {snap.localizacao[0]}, {snap.localizacao[1]}</p>
+            <p><b>Tarifas:</b> Base {snap.tarifa_base}€, Hora {snap.tarifa_hora}€, Máx {snap.tarifa_max}€</p>
 
-            <h3>Ocupação Atual: {ocupados}/{parque.capacidade} ({percentagem}%)</h3>
-            <progress value="{ocupados}" max="{parque.capacidade}"></progress>
+            <h3>Ocupação Atual: <span id="ocupacao">{ocupados}/{snap.capacidade} ({percentagem}%)</span></h3>
+            <progress id="barra" value="{ocupados}" max="{snap.capacidade}"></progress>
 
-            <table>
+            <table id="lugares">
                 <tr><th>ID</th><th>Estado</th></tr>
                 {linhas}
             </table>
-            <p style="font-size:0.9em;color:#777;">Atualiza automaticamente a cada 10s</p>
+            <p style="font-size:0.9em;color:#777;">Atualizado em tempo real (Server-Sent Events)</p>
         </div>
+        <script>
+            const cores = {{ OCUPADO: "#dc3545", LIVRE: "#28a745" }};
+            const tabela = document.getElementById("lugares");
+
+            function aplicar(evento) {{
+                const d = JSON.parse(evento.data);
+                document.getElementById("ocupacao").textContent =
+                    `${{d.ocupados}}/${{d.capacidade}} (${{d.ocupacao_percent}}%)`;
+                const barra = document.getElementById("barra");
+                barra.max = d.capacidade;
+                barra.value = d.ocupados;
+
+                for (const [id, estado] of d.lugares) {{
+                    let linha = document.getElementById("lugar-" + id);
+                    if (!linha) {{
+                        // Lugar registado depois de a página ser gerada (IDs crescentes: vai para o fim)
+                        linha = tabela.insertRow();
+                        linha.id = "lugar-" + id;
+                        linha.insertCell().textContent = id;
+                        linha.insertCell().style.fontWeight = "bold";
+                    }}
+                    linha.cells[1].textContent = estado;
+                    linha.cells[1].style.color = cores[estado];
+                }}
+            }}
+
+            const fonte = new EventSource("/stream");
+            fonte.addEventListener("completo", aplicar);
+            fonte.addEventListener("delta", aplicar);
+        </script>
     </body>
     </html>
     """
@@ -385,34 +1388,58 @@ def secure_info():
       - campo 'mensagem' com info do parque
       - 'assinatura' sobre a mensagem
       - 'certificado' do parque em PEM (utf-8)
-    """
-    livres = parque.capacidade - parque.contar_ocupados()
 
-    mensagem = {
-        "nome": parque.nome,
-        "lotacao": parque.capacidade,
-        "livre": livres,
-        "tarifa_base": parque.tarifa_base,
-        "tarifa/h": parque.tarifa_hora,
-        "tarifa_max": parque.tarifa_max,
-        "latitude": parque.localizacao[0],
-        "longitude": parque.localizacao[1],
-    }
-
-    if not getattr(parque, "certificado", None):
+    Enquanto os lugares livres e o certificado não mudam, o envelope guardado
+    em cache é reenviado sem voltar a assinar (a assinatura PSS é aleatória,
+    por isso só assim o ETag é forte). O ETag inclui a geração da chave e o
+    certificado: o envelope guardado é sempre de um par chave/certificado.
+    """
+    snap = parque.snapshot
+    credenciais = parque.credenciais  # lidas uma vez: chave e certificado do mesmo par
+    if not credenciais.certificado:
         erro = {"erro": "Certificado ainda não obtido junto do Gestor."}
         return Response(
             json.dumps(erro, indent=2), status=503, mimetype="application/json"
         )
 
-    assinatura = parque.assinar_mensagem(mensagem)
+    etag = _etag(
+        "secure-info",
+        snap.livres,
+        credenciais.geracao,
+        zlib.crc32(credenciais.certificado.encode("utf-8")),
+    )
+    try:
+        return _resposta_condicional(
+            "secure-info", etag, lambda: _envelope_info(snap, credenciais)
+        )
+    except ServicoSobrecarregado as e:
+        return _resposta_sobrecarga(e)
+
+
+def _resposta_sobrecarga(erro: ServicoSobrecarregado) -> Response:
+    """503 com Retry-After quando a fila de assinaturas está cheia."""
+    dados = {"erro": f"Serviço de assinatura sobrecarregado: {erro}"}
+    return Response(
+        json.dumps(dados, indent=2),
+        status=503,
+        mimetype="application/json",
+        headers={"Retry-After": "1"},
+    )
+
 
-    envelope = {
-        "assinatura": assinatura,
-        "certificado": parque.certificado,
-        "mensagem": mensagem,
+def _envelope_info(snap: Snapshot, credenciais: Credenciais) -> dict:
+    mensagem = {
+        "nome": snap.nome,
+        "lotacao": snap.capacidade,
+        "livre": snap.livres,
+        "tarifa_base": snap.tarifa_base,
+        "tarifa/h": snap.tarifa_hora,
+        "tarifa_max": snap.tarifa_max,
+        "latitude": snap.localizacao[0],
+        "longitude": snap.localizacao[1],
     }
-    return Response(json.dumps(envelope, indent=2), mimetype="application/json")
+
+    return parque.assinar_envelope(mensagem, credenciais)
 
 
 @app.route("/secure/custo", methods=["GET"])
@@ -420,7 +1447,7 @@ def secure_custo():
     """
     Endpoint seguro /secure/custo?tempo=X:
       - calcula custo
-      - assina mensagem {"valor": ...}
+      - assina mensagem {"valor": ...} (tabela pré-calculada por assinar_tarifas)
     """
     tempo = request.args.get("tempo")
 
@@ -429,25 +1456,21 @@ def secure_custo():
         if minutos < 0:
             raise ValueError
 
-        custo = parque.tarifa_base + (minutos / 60) * parque.tarifa_hora
-        custo = min(custo, parque.tarifa_max)
-
-        mensagem = {"valor": round(custo, 2)}
+        centimos = parque.calcular_custo(minutos)
 
-        if not getattr(parque, "certificado", None):
+        credenciais = parque.credenciais  # lidas uma vez: chave e certificado do mesmo par
+        if not credenciais.certificado:
             erro = {"erro": "Certificado ainda não obtido junto do Gestor."}
             return Response(
                 json.dumps(erro, indent=2), status=503, mimetype="application/json"
             )
 
-        assinatura = parque.assinar_mensagem(mensagem)
-        envelope = {
-            "assinatura": assinatura,
-            "certificado": parque.certificado,
-            "mensagem": mensagem,
-        }
+        envelope = parque.assinar_custo(centimos, credenciais)
         return Response(json.dumps(envelope, indent=2), mimetype="application/json")
 
+    except ServicoSobrecarregado as e:
+        return _resposta_sobrecarga(e)
+
     except (TypeError, ValueError):
         erro = {"erro": "Parâmetro 'tempo' inválido ou em falta"}
         return Response(
@@ -455,10 +1478,40 @@ def secure_custo():
         )
 
 
-def iniciar_tcp(parque: Parque):
-    """Servidor TCP para comunicação com os Lugares."""
+@app.route("/secure/custo/lote", methods=["GET"])
+def secure_custo_lote():
+    """
+    Versão segura de /custo/lote: a mensagem {"tempos": [...], "valores": [...]}
+    é assinada uma só vez, como um todo.
+    """
+    try:
+        minutos = _duracoes_lote()
+    except (KeyError, TypeError, ValueError):
+        erro = {"erro": "Parâmetros 'tempos' ou 'de'/'ate'/'passo' inválidos ou em falta"}
+        return Response(
+            json.dumps(erro, indent=2), status=400, mimetype="application/json"
+        )
+
+    credenciais = parque.credenciais  # lidas uma vez: chave e certificado do mesmo par
+    if not credenciais.certificado:
+        erro = {"erro": "Certificado ainda não obtido junto do Gestor."}
+        return Response(
+            json.dumps(erro, indent=2), status=503, mimetype="application/json"
+        )
+
+    try:
+        envelope = parque.assinar_envelope(_mensagem_lote(minutos), credenciais)
+    except ServicoSobrecarregado as e:
+        return _resposta_sobrecarga(e)
+    return Response(serializar(envelope), mimetype="application/json")
+
+
+def iniciar_tcp(parque: Parque, reuse_port: bool = False):
+    """Servidor TCP para comunicação com os Lugares (uma thread por ligação)."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         s.bind((HOST, PORT))
         s.listen()
         parque.tcp_ok = True  # diz que o servidor TCP arrancou com sucesso
@@ -476,6 +1529,163 @@ def iniciar_tcp(parque: Parque):
             thread.start()
 
 
+def _aumentar_limite_ficheiros() -> None:
+    """Sobe o limite de descritores abertos até ao máximo permitido (Unix)."""
+    try:
+        import resource
+    except ImportError:  # Windows: não há RLIMIT_NOFILE
+        return
+
+    suave, rigido = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if rigido == resource.RLIM_INFINITY or suave < rigido:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (rigido, rigido))
+        except (ValueError, OSError) as e:
+            log(
+                f"[SERVIDOR] Não foi possível aumentar o limite de ficheiros: {e}", "AVISO"
+            )
+
+
+async def _monitorizar_loop(parque: Parque, processo: int = 0):
+    """
+    Mede periodicamente o atraso do event loop (tempo extra face ao sleep
+    pedido) e guarda-o no estado partilhado, onde o processo Flask o lê.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(INTERVALO_MONITOR_LOOP)
+        atraso = loop.time() - inicio - INTERVALO_MONITOR_LOOP
+        parque.lugares.definir_atraso_loop(processo, max(atraso, 0.0) * 1000)
+
+
+async def _servidor_async(parque: Parque, reuse_port: bool = False, processo: int = 0):
+    servidor = await asyncio.start_server(
+        lambda r, w: handle_client_async(r, w, parque),
+        HOST,
+        PORT,
+        reuse_address=True,
+        reuse_port=reuse_port,
+        backlog=BACKLOG_TCP,
+    )
+    parque.tcp_ok = True
+
+    log(f"[SERVIDOR] Parque '{parque.nome}' ativo em {HOST}:{PORT} (asyncio)")
+    log(parque.info())
+
+    async with servidor:
+        asyncio.create_task(_monitorizar_loop(parque, processo))
+        await servidor.serve_forever()
+
+
+def iniciar_tcp_async(parque: Parque, reuse_port: bool = False, processo: int = 0):
+    """Servidor TCP para os Lugares num único event loop (modo asyncio)."""
+    _aumentar_limite_ficheiros()
+    asyncio.run(_servidor_async(parque, reuse_port, processo))
+
+
+def iniciar_servidor_sensores(parque: Parque, reuse_port: bool = False, processo: int = 0):
+    """
+    Arranca o servidor TCP dos Lugares no modo definido em MODO_TCP.
+    `processo` é o índice do processo TCP (posição do seu atraso do loop no estado partilhado).
+    """
+    if MODO_TCP == "asyncio":
+        iniciar_tcp_async(parque, reuse_port, processo)
+    elif MODO_TCP == "threads":
+        iniciar_tcp(parque, reuse_port)
+    else:
+        raise ValueError(f"MODO_TCP desconhecido: {MODO_TCP}")
+
+
+def iniciar_processos_sensores(parque: Parque):
+    """
+    Arranca PROCESSOS_TCP processos (fork), cada um com o seu socket na porta
+    dos sensores (SO_REUSEPORT: o kernel distribui as ligações). O estado dos
+    lugares e o mapa de nomes do parque têm de ter sido criados com partilhado=True.
+    """
+    if not parque.lugares.partilhado:
+        raise ValueError("Vários processos TCP exigem um Parque com partilhado=True")
+
+    contexto = multiprocessing.get_context("fork")
+    for indice in range(PROCESSOS_TCP):
+        # Com LOG_FICHEIRO, cada processo escreve (e roda) o seu: ex. parque.sensores-1.log
+        registo.sufixo_filho = f"sensores-{indice + 1}"
+        contexto.Process(
+            target=iniciar_servidor_sensores,
+            args=(parque, True, indice),
+            name=f"sensores-{indice + 1}",
+            daemon=True,
+        ).start()
+    registo.sufixo_filho = None
+
+    parque.tcp_ok = True
+    log(f"[SERVIDOR] {PROCESSOS_TCP} processos TCP a partilhar {HOST}:{PORT}")
+
+
+def publicar_snapshots(parque: Parque):
+    """
+    Publica um novo snapshot quando a versão do estado muda, no máximo uma vez
+    por INTERVALO_SNAPSHOT segundos: os leitores nunca esperam pelos sensores.
+    Como só compara versões, também apanha escritas feitas noutros processos.
+    """
+    while True:
+        if parque.lugares.versao != parque.snapshot.versao:
+            parque.publicar_snapshot()
+        time.sleep(INTERVALO_SNAPSHOT)
+
+
+def amostrar_historico(parque: Parque):
+    """
+    Junta ao histórico, a cada segundo, os ocupados e o nº de transições de
+    estado desde a amostra anterior (diferença de versões, que também conta
+    as escritas feitas noutros processos).
+    """
+    versao = parque.lugares.versao
+    while True:
+        time.sleep(1 - time.time() % 1)  # alinhado ao segundo
+        atual = parque.lugares.versao
+        parque.historico.registar(time.time(), parque.ocupados, atual - versao)
+        versao = atual
+
+
+def assinar_tarifas(parque: Parque):
+    """Pré-calcula em segundo plano as assinaturas de todos os custos possíveis."""
+    inicio = time.perf_counter()
+    assinados = parque.precomputar_tarifas()
+    if assinados:
+        log(
+            f"[SEGURANÇA] {assinados} custos assinados em "
+            f"{time.perf_counter() - inicio:.2f} s (tabela de /secure/custo)"
+        )
+    else:
+        log("[SEGURANÇA] Demasiados custos distintos: /secure/custo usa apenas o LRU", "AVISO")
+
+
+def manter_diario(parque: Parque):
+    """
+    Cria um instantâneo a cada DIARIO_INTERVALO_INSTANTANEO segundos (ou antes,
+    se o segmento atual passar DIARIO_MAX_SEGMENTO bytes), para que a
+    recuperação seja "último instantâneo + eventos recentes".
+    """
+    ultimo = time.monotonic()
+    while True:
+        time.sleep(1)
+        tamanho = parque.diario.tamanho_segmento()
+        expirado = time.monotonic() - ultimo >= DIARIO_INTERVALO_INSTANTANEO
+        if tamanho >= DIARIO_MAX_SEGMENTO or (expirado and tamanho > 0):
+            try:
+                inicio = time.perf_counter()
+                gravados = parque.criar_instantaneo()
+                log(
+                    f"[DIÁRIO] Instantâneo de {gravados} bytes gravado em "
+                    f"{(time.perf_counter() - inicio) * 1000:.1f} ms "
+                    f"({tamanho} bytes de eventos compactados)"
+                )
+            except OSError as e:
+                log(f"[DIÁRIO] Falha ao gravar o instantâneo: {e}", "ERRO")
+            ultimo = time.monotonic()
+
+
 def obter_ip_vpn() -> str:
     """Tenta identificar o IP da interface VPN (10.x.x.x ou 192.168.233.x)."""
     for iface, addrs in psutil.net_if_addrs().items():
@@ -496,6 +1706,8 @@ def registar_no_gestor(parque: Parque):
     """
     Regista o parque no Gestor de Parques e renova o registo a cada 3 minutos.
     Na Fase 4, também pede/atualiza o certificado digital via /parque_certificado.
+    Quando a chave passa CHAVE_VALIDADE_DIAS, gera aqui uma nova e só a instala
+    depois de o Gestor a certificar (os pedidos continuam a usar a anterior).
     """
     while True:
         try:
@@ -517,49 +1729,87 @@ def registar_no_gestor(parque: Parque):
                     f"[GESTOR] Registo efetuado com sucesso ({ip_local}:{dados_reg['porta']})"
                 )
             else:
-                log(f"[GESTOR] Erro no registo: {resposta.status_code} - {resposta.text}")
-
-            #Registo certificado (Fase 4)
-            pub_pem = (
-                parque.public_key.public_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PublicFormat.SubjectPublicKeyInfo,
-                )
-                .decode("utf-8")
-                .strip()
-            )
-
-            url_cert = f"http://{GESTOR_HOST}:{GESTOR_PORT}/parque_certificado"
-            dados_cert = {
-                "ip": ip_local,
-                "porta": 5000,
-                "nome": parque.nome,
-                "pubKey": pub_pem,
-            }
-
-            resp_cert = requests.post(url_cert, json=dados_cert, timeout=5)
-
-            if resp_cert.status_code in (200, 201):
-                parque.certificado = resp_cert.text.strip()
                 log(
-                    f"[GESTOR] Certificado digital recebido/atualizado "
-                    f"(tamanho: {len(parque.certificado)} caracteres)."
+                    f"[GESTOR] Erro no registo: {resposta.status_code} - {resposta.text}",
+                    "AVISO",
                 )
+
+            #Registo certificado (Fase 4)
+            if parque.chave_expirada():
+                log(f"[SEGURANÇA] Chave com mais de {CHAVE_VALIDADE_DIAS} dias: a gerar nova")
+                nova = gerar_chave(parque.algoritmo)
+                certificado = pedir_certificado(parque, ip_local, nova.public_key())
+                if certificado:
+                    parque.instalar_chaves(nova, certificado)
+                    log("[SEGURANÇA] Nova chave certificada e instalada")
+                    # Numa thread à parte, como no arranque: não atrasa o registo no Gestor
+                    threading.Thread(target=assinar_tarifas, args=(parque,), daemon=True).start()
             else:
-                log(
-                    f"[GESTOR] Erro ao obter certificado: "
-                    f"{resp_cert.status_code} - {resp_cert.text}"
-                )
+                certificado = pedir_certificado(parque, ip_local, parque.public_key)
+                if certificado:
+                    parque.definir_certificado(certificado)
 
         except requests.exceptions.RequestException as e:
-            log(f"[GESTOR] Falha ao contactar o Gestor: {e}")
+            log(f"[GESTOR] Falha ao contactar o Gestor: {e}", "ERRO")
 
         # Repetir o registo a cada 3 minutos (180 segundos)
         time.sleep(180)
 
 
+def pedir_certificado(parque: Parque, ip_local: str, chave_publica) -> str | None:
+    """Pede ao Gestor (/parque_certificado) um certificado para `chave_publica`."""
+    pub_pem = (
+        chave_publica.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode("utf-8")
+        .strip()
+    )
+
+    url_cert = f"http://{GESTOR_HOST}:{GESTOR_PORT}/parque_certificado"
+    dados_cert = {
+        "ip": ip_local,
+        "porta": 5000,
+        "nome": parque.nome,
+        "pubKey": pub_pem,
+    }
+
+    resp_cert = requests.post(url_cert, json=dados_cert, timeout=5)
+
+    if resp_cert.status_code in (200, 201):
+        certificado = resp_cert.text.strip()
+        log(
+            f"[GESTOR] Certificado digital recebido/atualizado "
+            f"(tamanho: {len(certificado)} caracteres)."
+        )
+        return certificado
+
+    log(
+        f"[GESTOR] Erro ao obter certificado: "
+        f"{resp_cert.status_code} - {resp_cert.text}",
+        "AVISO",
+    )
+    return None
+
+
+def abrir_chaves() -> ArmazemChaves | None:
+    """Armazém de chaves de CHAVES_DIRETORIO, se configurado e com senha no ambiente."""
+    if not CHAVES_DIRETORIO:
+        return None
+    senha = os.environ.get(CHAVES_SENHA_ENV)
+    if not senha:
+        log(
+            f"[SEGURANÇA] {CHAVES_SENHA_ENV} não definida: a chave não é guardada em disco",
+            "AVISO",
+        )
+        return None
+    return ArmazemChaves(CHAVES_DIRETORIO, senha.encode("utf-8"))
+
+
 def main():
     global parque
+    diario = Diario(DIARIO_DIRETORIO, DIARIO_INTERVALO_FSYNC) if DIARIO_DIRETORIO else None
     parque = Parque(
         nome="Parque PL3_G3",
         latitude=41.1579,
@@ -568,15 +1818,37 @@ def main():
         tarifa_hora=0.8,
         tarifa_max=6.0,
         capacidade=CAPACIDADE,
+        partilhado=PROCESSOS_TCP > 1,
+        diario=diario,
+        chaves=abrir_chaves(),
     )
 
-    # 1 - Servidor TCP numa thread (lugares)
-    threading.Thread(target=iniciar_tcp, args=(parque,), daemon=True).start()
+    # 1 - Servidor TCP (lugares), em modo threads ou asyncio: numa thread, ou em
+    #     vários processos antes de arrancar as restantes threads (fork)
+    if PROCESSOS_TCP > 1:
+        iniciar_processos_sensores(parque)
+    else:
+        threading.Thread(
+            target=iniciar_servidor_sensores, args=(parque,), daemon=True
+        ).start()
+
+    # 2 - Publicação periódica dos snapshots lidos pela API REST
+    threading.Thread(target=publicar_snapshots, args=(parque,), daemon=True).start()
+
+    # Amostragem do histórico de ocupação
+    threading.Thread(target=amostrar_historico, args=(parque,), daemon=True).start()
+
+    # Instantâneos e compactação do diário (se ativo)
+    if parque.diario is not None:
+        threading.Thread(target=manter_diario, args=(parque,), daemon=True).start()
+
+    # Tabela de custos assinados para /secure/custo
+    threading.Thread(target=assinar_tarifas, args=(parque,), daemon=True).start()
 
-    # 2 - Registo no Gestor + certificado numa thread
+    # 3 - Registo no Gestor + certificado numa thread
     threading.Thread(target=registar_no_gestor, args=(parque,), daemon=True).start()
 
-    # 3 - API REST (Flask) — corre no thread principal
+    # 4 - API REST (Flask) — corre no thread principal
     app.run(host="0.0.0.0", port=5000, threaded=True)
 
 
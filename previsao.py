@@ -0,0 +1,125 @@
+# previsao.py
+"""Previsão da ocupação: taxas de transição estimadas por lugar e projeção vetorial (NumPy)."""
+
+import math
+
+import numpy as np
+
+try:  # Permite usar o módulo diretamente (ex: benchmarks) ou como parte do pacote FSD
+    from FSD.armazem import OCUPADO
+except ModuleNotFoundError:  # pragma: no cover - apenas em execução direta
+    from armazem import OCUPADO
+
+# Contagens por lugar (uint32): passos observados a partir de cada estado e mudanças
+_PASSOS_LIVRE = 0
+_LIVRE_OCUPADO = 1
+_PASSOS_OCUPADO = 2
+_OCUPADO_LIVRE = 3
+_N_CONTAGENS = 4
+
+_Z_90 = 1.6449  # quantil 95% da normal: intervalo central de 90%
+
+
+class EstimadorTransicoes:
+    """
+    Cada UPDATE aceite é um passo da cadeia de Markov do sensor (o simulador
+    envia o estado a cada INTERVALO_SIMULACAO, mesmo que não mude). Guarda-se,
+    por lugar, quantos passos partiram de cada estado e quantos mudaram de
+    estado; daí saem as estimativas de PO (LIVRE -> OCUPADO) e PL (OCUPADO -> LIVRE).
+
+    As contagens vivem num buffer contíguo (memória partilhada se partilhado=True,
+    como em ArmazemLugares), para serem lidas de uma vez como matriz NumPy.
+    Chamar observar() com o lock da fatia do lugar.
+    """
+
+    def __init__(self, capacidade: int, partilhado: bool = False):
+        self.capacidade = capacidade
+        tamanho = 4 * _N_CONTAGENS * (capacidade + 1)
+
+        if partilhado:
+            from multiprocessing import shared_memory
+
+            self._shm = shared_memory.SharedMemory(create=True, size=tamanho)
+            buffer = self._shm.buf
+        else:
+            self._shm = None
+            buffer = memoryview(bytearray(tamanho))
+        self._contagens = buffer.cast("I")
+
+    def fechar(self) -> None:
+        """Liberta o segmento de memória partilhada (só no processo que o criou)."""
+        if self._shm is not None:
+            self._contagens.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def observar(self, lugar_id: int, anterior: str | None, novo: str) -> None:
+        """Regista um passo do lugar (anterior -> novo)."""
+        base = lugar_id * _N_CONTAGENS
+        if anterior == "LIVRE":
+            self._contagens[base + _PASSOS_LIVRE] += 1
+            if novo == "OCUPADO":
+                self._contagens[base + _LIVRE_OCUPADO] += 1
+        elif anterior == "OCUPADO":
+            self._contagens[base + _PASSOS_OCUPADO] += 1
+            if novo == "LIVRE":
+                self._contagens[base + _OCUPADO_LIVRE] += 1
+
+    def taxas(self, po_prior: float, pl_prior: float, peso_prior: float):
+        """
+        Estimativas (po, pl) por lugar, como vetores NumPy indexados pelo ID.
+
+        Cada lugar é suavizado com `peso_prior` passos fictícios à taxa do
+        parque inteiro (que por sua vez parte das taxas a priori da
+        configuração), para que lugares com poucas observações num estado não
+        tenham taxas extremas nem enviesadas para o valor configurado.
+        """
+        contagens = np.frombuffer(self._contagens, dtype=np.uint32).reshape(-1, _N_CONTAGENS)
+        contagens = contagens.astype(np.float64)
+        totais = contagens.sum(axis=0)
+
+        def estimar(mudancas: int, passos: int, prior: float):
+            global_ = (totais[mudancas] + peso_prior * prior) / (totais[passos] + peso_prior)
+            return (contagens[:, mudancas] + peso_prior * global_) / (
+                contagens[:, passos] + peso_prior
+            )
+
+        po = estimar(_LIVRE_OCUPADO, _PASSOS_LIVRE, po_prior)
+        pl = estimar(_OCUPADO_LIVRE, _PASSOS_OCUPADO, pl_prior)
+        return po, pl
+
+    def observacoes(self) -> int:
+        contagens = np.frombuffer(self._contagens, dtype=np.uint32).reshape(-1, _N_CONTAGENS)
+        return int(contagens[:, [_PASSOS_LIVRE, _PASSOS_OCUPADO]].sum())
+
+
+def projetar(estados: bytes, po: np.ndarray, pl: np.ndarray, passos: int) -> dict:
+    """
+    Distribuição da ocupação daqui a `passos` passos, para todos os lugares de uma vez.
+
+    Cada lugar é uma cadeia de dois estados com matriz P = [[1-po, po], [pl, 1-pl]].
+    Os valores próprios de P são 1 e λ = 1 - po - pl, por isso P^n tem forma
+    fechada: P(ocupado ao fim de n) = π + (x0 - π)·λ^n, com π = po/(po+pl) e x0
+    o estado atual (1 se ocupado). Os lugares são independentes: a ocupação
+    total tem média Σp e variância Σp(1-p) (aproximação normal para o intervalo).
+    """
+    codigos = np.frombuffer(estados, dtype=np.uint8)
+    registados = codigos != 0
+    x0 = (codigos[registados] == OCUPADO).astype(np.float64)
+    po, pl = po[registados], pl[registados]
+
+    soma = po + pl
+    pi = np.divide(po, soma, out=x0.copy(), where=soma > 0)  # po = pl = 0: fica como está
+    prob = pi + (x0 - pi) * np.power(1.0 - soma, passos)
+
+    media = float(prob.sum())
+    desvio = math.sqrt(float((prob * (1.0 - prob)).sum()))
+    return {
+        "media": media,
+        "desvio": desvio,
+        "minimo": max(0.0, media - _Z_90 * desvio),
+        "maximo": min(float(len(prob)), media + _Z_90 * desvio),
+        "po_medio": float(po.mean()) if len(po) else 0.0,
+        "pl_medio": float(pl.mean()) if len(pl) else 0.0,
+    }
@@ -1,6 +1,13 @@
 # protocolo.py
+import struct
+from collections import deque
+
 DELIMITADOR = ";;"
 
+# Enquadramento: cada mensagem é precedida pelo seu tamanho (4 bytes, big-endian)
+CABECALHO = struct.Struct("!I")
+TAMANHO_MAX_MENSAGEM = 64 * 1024
+
 class ProtocoloErro(Exception):
     """Exceção base para erros de protocolo."""
 
@@ -14,13 +21,41 @@ class ParametrosInvalidos(ProtocoloErro):
     pass
 
 
+# Parâmetros que transportam listas de pares (ex: MUPDATE;;itens=1:OCUPADO,2:LIVRE)
+PARAMETROS_LISTA = ("itens", "resultados")
+SEPARADOR_ITENS = ","
+SEPARADOR_PAR = ":"
+
+
+def _codificar_valor(valor) -> str:
+    """Converte listas de pares em "a:b,c:d"; os restantes valores ficam como texto."""
+    if isinstance(valor, (list, tuple)):
+        return SEPARADOR_ITENS.join(f"{a}{SEPARADOR_PAR}{b}" for a, b in valor)
+    return valor
+
+
+def _descodificar_lista(valor: str) -> list[tuple[str, str]]:
+    """Converte "a:b,c:d" numa lista de pares [("a", "b"), ("c", "d")]."""
+    pares = []
+    for item in valor.split(SEPARADOR_ITENS):
+        if not item.strip():
+            continue
+        if SEPARADOR_PAR not in item:
+            raise FormatoInvalido(f"Item mal formatado: {item}")
+        a, b = item.split(SEPARADOR_PAR, 1)
+        pares.append((a.strip(), b.strip()))
+    return pares
+
+
 def codificar(comando: str, **kwargs) -> str:
     """
     Gera uma mensagem no formato do protocolo.
     Exemplo: codificar("UPDATE", id=3, estado="OCUPADO")
     -> "UPDATE;;id=3;;estado=OCUPADO"
+    Exemplo: codificar("MUPDATE", itens=[(1, "OCUPADO"), (2, "LIVRE")])
+    -> "MUPDATE;;itens=1:OCUPADO,2:LIVRE"
     """
-    partes = [comando] + [f"{k}={v}" for k, v in kwargs.items()]
+    partes = [comando] + [f"{k}={_codificar_valor(v)}" for k, v in kwargs.items()]
     return DELIMITADOR.join(partes)
 
 
@@ -28,6 +63,7 @@ def descodificar(mensagem: str) -> dict:
     """
     Converte uma mensagem em dicionário validado.
     Aceita comandos simples (ex: "INIT") ou com parâmetros (ex: "UPDATE;;id=1;;estado=LIVRE").
+    Os parâmetros em PARAMETROS_LISTA são devolvidos como lista de pares.
     """
     partes = mensagem.split(DELIMITADOR)
     comando = partes[0].strip().upper()
@@ -38,8 +74,189 @@ def descodificar(mensagem: str) -> dict:
     for p in partes[1:]:
         if "=" in p:
             k, v = p.split("=", 1)
-            dados[k.strip()] = v.strip()
+            k = k.strip()
+            dados[k] = _descodificar_lista(v) if k in PARAMETROS_LISTA else v.strip()
         elif p.strip():  # havia texto mas sem '='
             raise FormatoInvalido(f"Parâmetro mal formatado: {p}")
 
-    return {"comando": comando, **dados}
\ No newline at end of file
+    return {"comando": comando, **dados}
+
+
+def enquadrar(mensagem: str | bytes) -> bytes:
+    """
+    Prefixa a mensagem com o seu tamanho, pronta a enviar pelo socket.
+    Exemplo: enquadrar("INFO") -> b"\\x00\\x00\\x00\\x04INFO"
+    """
+    if isinstance(mensagem, str):
+        mensagem = mensagem.encode()
+    if len(mensagem) > TAMANHO_MAX_MENSAGEM:
+        raise FormatoInvalido(f"Mensagem demasiado grande ({len(mensagem)} bytes)")
+    return CABECALHO.pack(len(mensagem)) + mensagem
+
+
+class DescodificadorStream:
+    """
+    Descodificador incremental de mensagens enquadradas.
+
+    Recebe blocos de bytes arbitrários (tal como chegam do recv, que pode juntar
+    várias mensagens ou partir uma ao meio) e devolve apenas mensagens completas,
+    pela ordem de chegada. Permite que o cliente envie vários pedidos seguidos
+    sem esperar pelas respostas (pipelining).
+    """
+
+    def __init__(self, tamanho_max: int = TAMANHO_MAX_MENSAGEM):
+        self.tamanho_max = tamanho_max
+        self._buffer = bytearray()
+        self._prontas: deque[bytes] = deque()
+
+    def alimentar(self, dados: bytes) -> None:
+        """Acrescenta bytes recebidos e extrai todas as mensagens completas."""
+        self._buffer += dados
+        pos = 0
+        fim = len(self._buffer)
+
+        while fim - pos >= CABECALHO.size:
+            (tamanho,) = CABECALHO.unpack_from(self._buffer, pos)
+            if tamanho > self.tamanho_max:
+                raise FormatoInvalido(f"Mensagem demasiado grande ({tamanho} bytes)")
+            inicio = pos + CABECALHO.size
+            if fim - inicio < tamanho:
+                break  # mensagem ainda incompleta
+            self._prontas.append(bytes(self._buffer[inicio:inicio + tamanho]))
+            pos = inicio + tamanho
+
+        if pos:
+            del self._buffer[:pos]
+
+    def proxima(self) -> bytes | None:
+        """Devolve a próxima mensagem completa, ou None se ainda não houver."""
+        return self._prontas.popleft() if self._prontas else None
+
+    def __iter__(self):
+        while self._prontas:
+            yield self._prontas.popleft()
+
+
+# Protocolo binário (opcional, negociado no INIT com formato=binario)
+#
+# Layout fixo com struct, sem repetir "UPDATE", "id=", "estado=" em cada mensagem.
+# Os opcodes são < 0x20, pelo que uma mensagem binária nunca começa por uma
+# letra e pode conviver com mensagens de texto na mesma ligação.
+
+FORMATO_TEXTO = "texto"
+FORMATO_BINARIO = "binario"
+FORMATOS_SUPORTADOS = (FORMATO_TEXTO, FORMATO_BINARIO)
+
+OP_UPDATE = 0x01
+OP_MUPDATE = 0x02
+OP_OK = 0x10
+OP_OK_LOTE = 0x11
+OP_ERRO = 0x12
+
+ESTADOS_BINARIO = ("LIVRE", "OCUPADO")  # código no fio = índice
+CODIGO_ESTADO = {estado: codigo for codigo, estado in enumerate(ESTADOS_BINARIO)}
+CODIGO_ESTADO_INVALIDO = 0xFF
+
+# Resultados por item (MUPDATE) e códigos de erro (OP_ERRO)
+RESULTADOS_BINARIO = ("OK", "ID_INVALIDO", "ESTADO_INVALIDO")
+ERROS_BINARIO = ("ERRO", "ID_INVALIDO", "ESTADO_INVALIDO", "FORMATO_INVALIDO", "COMANDO_INVALIDO")
+
+_UPDATE = struct.Struct("!BIB")       # opcode, id, estado
+_MUPDATE = struct.Struct("!BH")       # opcode, número de itens (seguido de N x _ITEM)
+_ITEM = struct.Struct("!IB")          # id, estado
+_OK = struct.Struct("!BII")           # opcode, ocupados, capacidade
+_OK_LOTE = struct.Struct("!BIIH")     # opcode, ocupados, capacidade, N (seguido de N bytes)
+_ERRO = struct.Struct("!BB")          # opcode, código de erro
+
+
+def e_binaria(mensagem: bytes) -> bool:
+    """Indica se uma mensagem (já desenquadrada) está no formato binário."""
+    return bool(mensagem) and mensagem[0] < 0x20
+
+
+def _estado_do_codigo(codigo: int) -> str:
+    return ESTADOS_BINARIO[codigo] if codigo < len(ESTADOS_BINARIO) else f"#{codigo}"
+
+
+def codificar_update_binario(lugar_id: int, estado: str) -> bytes:
+    """Exemplo: codificar_update_binario(3, "OCUPADO") -> b"\\x01\\x00\\x00\\x00\\x03\\x01" """
+    return _UPDATE.pack(OP_UPDATE, lugar_id, CODIGO_ESTADO.get(estado, CODIGO_ESTADO_INVALIDO))
+
+
+def codificar_mupdate_binario(itens: list[tuple[int, str]]) -> bytes:
+    """Codifica um lote de pares (id, estado) numa única mensagem binária."""
+    partes = [_MUPDATE.pack(OP_MUPDATE, len(itens))]
+    partes += [
+        _ITEM.pack(lid, CODIGO_ESTADO.get(estado, CODIGO_ESTADO_INVALIDO))
+        for lid, estado in itens
+    ]
+    return b"".join(partes)
+
+
+def codificar_ok_binario(ocupados: int, capacidade: int, resultados: list[str] | None = None) -> bytes:
+    """Resposta de sucesso; com resultados (um por item) quando responde a um MUPDATE."""
+    if resultados is None:
+        return _OK.pack(OP_OK, ocupados, capacidade)
+    codigos = bytes(RESULTADOS_BINARIO.index(r) for r in resultados)
+    return _OK_LOTE.pack(OP_OK_LOTE, ocupados, capacidade, len(codigos)) + codigos
+
+
+def codificar_erro_binario(erro: str) -> bytes:
+    """Resposta de erro; erro deve ser um dos ERROS_BINARIO (senão fica "ERRO")."""
+    codigo = ERROS_BINARIO.index(erro) if erro in ERROS_BINARIO else 0
+    return _ERRO.pack(OP_ERRO, codigo)
+
+
+def descodificar_binario(mensagem: bytes) -> dict:
+    """
+    Converte uma mensagem binária no mesmo tipo de dicionário que descodificar().
+    Exemplo: b"\\x01\\x00\\x00\\x00\\x03\\x01" -> {"comando": "UPDATE", "id": 3, "estado": "OCUPADO"}
+    """
+    try:
+        opcode = mensagem[0]
+
+        if opcode == OP_UPDATE:
+            _, lugar_id, estado = _UPDATE.unpack(mensagem)
+            return {"comando": "UPDATE", "id": lugar_id, "estado": _estado_do_codigo(estado)}
+
+        if opcode == OP_MUPDATE:
+            _, n = _MUPDATE.unpack_from(mensagem)
+            if len(mensagem) != _MUPDATE.size + n * _ITEM.size:
+                raise FormatoInvalido("Tamanho do lote não corresponde ao número de itens")
+            itens = [
+                (lid, _estado_do_codigo(estado))
+                for lid, estado in _ITEM.iter_unpack(memoryview(mensagem)[_MUPDATE.size:])
+            ]
+            return {"comando": "MUPDATE", "itens": itens}
+
+        if opcode == OP_OK:
+            _, ocupados, capacidade = _OK.unpack(mensagem)
+            return {"comando": "OK", "ocupados": ocupados, "capacidade": capacidade}
+
+        if opcode == OP_OK_LOTE:
+            _, ocupados, capacidade, n = _OK_LOTE.unpack_from(mensagem)
+            codigos = mensagem[_OK_LOTE.size:]
+            if len(codigos) != n:
+                raise FormatoInvalido("Tamanho do lote não corresponde ao número de itens")
+            return {
+                "comando": "OK",
+                "ocupados": ocupados,
+                "capacidade": capacidade,
+                "resultados": [RESULTADOS_BINARIO[c] for c in codigos],
+            }
+
+        if opcode == OP_ERRO:
+            _, codigo = _ERRO.unpack(mensagem)
+            return {"comando": "ERRO", "msg": ERROS_BINARIO[codigo]}
+
+    except (struct.error, IndexError) as e:
+        raise FormatoInvalido(f"Mensagem binária mal formatada: {e}")
+
+    raise ComandoInvalido(f"Opcode inválido: {opcode:#04x}")
+
+
+def descodificar_mensagem(mensagem: bytes) -> dict:
+    """Descodifica uma mensagem desenquadrada, seja de texto ou binária."""
+    if e_binaria(mensagem):
+        return descodificar_binario(mensagem)
+    return descodificar(mensagem.decode().strip())
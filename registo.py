@@ -0,0 +1,165 @@
+# registo.py
+"""Registo (log) assíncrono: fila + thread que escreve em lotes."""
+
+import atexit
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+
+NIVEIS = {"DEBUG": 10, "INFO": 20, "AVISO": 30, "ERRO": 40}
+
+
+class RegistoAssincrono:
+    """
+    Quem regista só coloca a mensagem numa fila limitada (sem I/O nem
+    strftime no caminho dos sensores); uma thread dedicada formata e escreve
+    as mensagens em lotes, para o stdout ou para um ficheiro rotativo.
+
+    Se a fila estiver cheia a mensagem é descartada e contada em `descartadas`.
+
+    Num processo filho (fork) com ficheiro, o registo passa para um ficheiro
+    próprio (registo.log -> registo.<sufixo>.log), para que cada processo
+    escreva e rode apenas o seu. O sufixo é `sufixo_filho`, se quem faz o
+    fork o definir antes (ex: índice do processo TCP), ou o PID.
+    """
+
+    def __init__(
+        self,
+        nivel: str = "INFO",
+        ficheiro: str | None = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        n_backups: int = 5,
+        tamanho_fila: int = 10_000,
+        amostragem: int = 1,
+        tamanho_lote: int = 512,
+    ):
+        self.nivel = NIVEIS[nivel]
+        self.ficheiro = ficheiro
+        self.max_bytes = max_bytes
+        self.n_backups = n_backups
+        self.amostragem = max(1, amostragem)
+        self.tamanho_lote = tamanho_lote
+
+        self.sufixo_filho = None
+        self.descartadas = 0
+        self.escritas = 0
+        self._lock_descartadas = threading.Lock()
+        self._contador_amostras = itertools.count()
+        self._fila: queue.Queue = queue.Queue(maxsize=tamanho_fila)
+
+        self._saida = None
+        self._bytes_escritos = 0
+        self._ultimo_segundo = None
+        self._hora = ""
+
+        self._iniciar_thread()
+        atexit.register(self.fechar)
+        if hasattr(os, "register_at_fork"):
+            # Num processo filho (fork) a thread de escrita não existe: recriá-la
+            os.register_at_fork(after_in_child=self._depois_do_fork)
+
+    def _iniciar_thread(self) -> None:
+        self._thread = threading.Thread(target=self._escrever, name="registo", daemon=True)
+        self._thread.start()
+
+    def _depois_do_fork(self) -> None:
+        if self.ficheiro is not None:
+            base, extensao = os.path.splitext(self.ficheiro)
+            self.ficheiro = f"{base}.{self.sufixo_filho or os.getpid()}{extensao}"
+        self._saida = None
+        self._fila = queue.Queue(maxsize=self._fila.maxsize)
+        self._lock_descartadas = threading.Lock()
+        self._iniciar_thread()
+
+    #  Lado de quem regista (não bloqueia)
+    def registar(self, msg: str, nivel: str = "INFO") -> None:
+        """Coloca a mensagem na fila, se o nível o permitir."""
+        if NIVEIS[nivel] < self.nivel:
+            return
+        try:
+            self._fila.put_nowait((time.time(), nivel, msg))
+        except queue.Full:
+            with self._lock_descartadas:
+                self.descartadas += 1
+
+    def registar_amostrado(self, msg: str, nivel: str = "INFO") -> None:
+        """Para mensagens por pedido: só regista 1 em cada `amostragem`."""
+        if next(self._contador_amostras) % self.amostragem == 0:
+            self.registar(msg, nivel)
+
+    def fechar(self) -> None:
+        """Espera que a fila seja escrita (chamado automaticamente à saída)."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(None, timeout=2)
+        except queue.Full:
+            return
+        self._thread.join(timeout=2)
+
+    #  Thread de escrita
+    def _formatar(self, instante: float, nivel: str, msg: str) -> str:
+        segundo = int(instante)
+        if segundo != self._ultimo_segundo:  # strftime só uma vez por segundo
+            self._ultimo_segundo = segundo
+            self._hora = time.strftime("%H:%M:%S", time.localtime(segundo))
+        if nivel == "INFO":
+            return f"[{self._hora}] {msg}\n"
+        return f"[{self._hora}] [{nivel}] {msg}\n"
+
+    def _abrir(self) -> None:
+        if self.ficheiro is None:
+            self._saida = sys.stdout
+            return
+        self._saida = open(self.ficheiro, "a", encoding="utf-8")
+        self._bytes_escritos = self._saida.tell()
+
+    def _rodar(self) -> None:
+        """Roda os ficheiros: registo.log -> registo.log.1 -> ... -> registo.log.N"""
+        self._saida.close()
+        for i in range(self.n_backups - 1, 0, -1):
+            origem = f"{self.ficheiro}.{i}"
+            if os.path.exists(origem):
+                os.replace(origem, f"{self.ficheiro}.{i + 1}")
+        if self.n_backups > 0:
+            os.replace(self.ficheiro, f"{self.ficheiro}.1")
+        else:
+            os.remove(self.ficheiro)
+        self._abrir()
+
+    def _escrever(self) -> None:
+        terminar = False
+
+        while not terminar:
+            lote = [self._fila.get()]
+            # Junta tudo o que já está na fila (até tamanho_lote) numa só escrita
+            while len(lote) < self.tamanho_lote:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in lote:
+                terminar = True
+                lote = [item for item in lote if item is not None]
+            if not lote:
+                continue
+
+            texto = "".join(self._formatar(*item) for item in lote)
+            try:
+                if self._saida is None:
+                    # Só à primeira escrita: um filho que nunca regista não cria ficheiro
+                    self._abrir()
+                self._saida.write(texto)
+                self._saida.flush()
+            except (OSError, ValueError):
+                continue  # stdout fechado / disco cheio: não derrubar o parque
+            self.escritas += len(lote)
+
+            if self.ficheiro is not None:
+                self._bytes_escritos += len(texto.encode("utf-8"))
+                if self._bytes_escritos >= self.max_bytes:
+                    self._rodar()
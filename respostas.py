@@ -0,0 +1,39 @@
+# respostas.py
+"""Cache de respostas REST já serializadas, invalidada pela versão do estado."""
+
+import json
+
+
+def serializar(dados, bonito: bool = False) -> bytes:
+    """JSON compacto por omissão; indentado só quando pedido (ex: ?pretty=1)."""
+    if bonito:
+        return json.dumps(dados, indent=2).encode("utf-8")
+    return json.dumps(dados, separators=(",", ":")).encode("utf-8")
+
+
+class CacheRespostas:
+    """
+    Um corpo (bytes) por endpoint e representação, guardado com a chave de que
+    depende (o ETag: versão do estado, contagens, certificado...). Enquanto a
+    chave não muda, os pedidos reutilizam os bytes sem reconstruir nem
+    serializar nada; quando muda, o primeiro pedido gera o corpo novo.
+
+    Não há locks: dois pedidos simultâneos podem gerar o mesmo corpo, mas a
+    substituição da entrada é atómica e qualquer das versões é válida.
+    """
+
+    def __init__(self):
+        self._entradas: dict[object, tuple[str, bytes]] = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, nome, chave: str, gerar) -> bytes:
+        entrada = self._entradas.get(nome)
+        if entrada is not None and entrada[0] == chave:
+            self.acertos += 1
+            return entrada[1]
+
+        self.falhas += 1
+        corpo = gerar()
+        self._entradas[nome] = (chave, corpo)
+        return corpo